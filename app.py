@@ -2,44 +2,459 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import time
-import zlib
-import FinanceDataReader as fdr
-import random
-from datetime import datetime
+import os
+import importlib
+import re
+import uuid
+import bisect
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from timing import TIMINGS, timed
+from engine import TTLCache, data_bucket, MetricsBook, MetricsProvider, PortfolioAnalytics, SingularityEngine, Pick, scan_market, scan_stream, finish_scan, personalize
 
 # -----------------------------------------------------------------------------
 # [0] SYSTEM CONFIG
 # -----------------------------------------------------------------------------
 st.set_page_config(page_title="Hojji & Hamzzi Quant", page_icon="🐹", layout="centered")
-
-# [핵심] 시장 지수 독립 호출 (버튼 딜레이 원천 차단)
-def get_current_market():
-    try:
-        kp = fdr.DataReader('KS11').iloc[-1]
-        kd = fdr.DataReader('KQ11').iloc[-1]
-        return {
-            'kospi': {'v': kp['Close'], 'c': kp['Comp'], 'r': kp['Change']},
-            'kosdaq': {'v': kd['Close'], 'c': kd['Comp'], 'r': kd['Change']}
-        }
-    except: return None
-
-@st.cache_data(ttl=86400)
-def get_stock_list():
+_script_t0 = time.perf_counter()
+
+# 외부 모듈 지연 import - 처음 속성에 접근할 때 로드 (시작 시 화면부터 그림)
+class LazyModule:
+    def __init__(self, name):
+        self._name = name; self._mod = None; self._lock = threading.Lock()
+
+    def __getattr__(self, attr):
+        if self._mod is None:
+            with self._lock:
+                if self._mod is None: self._mod = importlib.import_module(self._name)
+        return getattr(self._mod, attr)
+
+fdr = LazyModule("FinanceDataReader")
+
+# 세션 공용 결과 캐시 + single-flight (같은 키 동시 요청은 계산 1번, 나머지는 그 결과를 기다림)
+class SharedResults:
+    def __init__(self, maxsize=256, ttl=3600, wait_timeout=120):
+        self.cache = TTLCache(maxsize, ttl); self.wait_timeout = wait_timeout
+        self._inflight = {}; self._lock = threading.Lock()
+
+    # 직접 계산하며 진행 상황을 그릴 때: (값, None, False) 캐시 적중 / (None, fut, True) 주인 / (None, fut, False) 대기
+    # 주인은 반드시 finish() 또는 fail()로 끝냄
+    def begin(self, key):
+        hit = self.cache.get(key)
+        if hit is not None: return hit, None, False
+        with self._lock:
+            hit = self.cache.get(key)
+            if hit is not None: return hit, None, False
+            fut = self._inflight.get(key); owner = fut is None
+            if owner: fut = self._inflight[key] = Future()
+        return None, fut, owner
+
+    def finish(self, key, fut, val):
+        self.cache.set(key, val); fut.set_result(val)
+        with self._lock: self._inflight.pop(key, None)
+
+    # 주인 스레드가 Streamlit 재실행/중지 등으로 끊겨도 기다리는 쪽은 반드시 깨움
+    def fail(self, key, fut, exc):
+        fut.set_exception(exc if isinstance(exc, Exception) else RuntimeError(f"{key}: 계산이 중단됨"))
+        with self._lock: self._inflight.pop(key, None)
+
+    def wait(self, fut):
+        return fut.result(timeout=self.wait_timeout)
+
+    def get_or_compute(self, key, fn):
+        hit, fut, owner = self.begin(key)
+        if hit is not None: return hit
+        if not owner: return self.wait(fut)
+        try: val = fn()
+        except BaseException as e:
+            self.fail(key, fut, e); raise
+        self.finish(key, fut, val)
+        return val
+
+@st.cache_resource(show_spinner=False)
+def get_shared():
+    return SharedResults()
+
+# [핵심] 로컬 Parquet 저장소 (재시작/오프라인에도 데이터 유지)
+DATA_DIR = os.environ.get("HH_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data"))
+HISTORY_DAYS = 365 * 3
+OHLCV_COLS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+class DataStore:
+    def __init__(self, root=DATA_DIR, ttl=3600):
+        self.root = root; self.ttl = ttl
+        os.makedirs(os.path.join(root, "ohlcv"), exist_ok=True)
+        self._locks = {}; self._lock = threading.Lock()
+
+    def _key_lock(self, path):
+        with self._lock: return self._locks.setdefault(path, threading.Lock())
+
+    def _age(self, path):
+        return time.time() - os.path.getmtime(path) if os.path.exists(path) else float('inf')
+
+    # 일봉 파일 수정 시각 (MetricsBook이 바뀌지 않은 파일을 다시 읽지 않도록)
+    def mtime(self, code):
+        try: return os.path.getmtime(os.path.join(self.root, "ohlcv", f"{code}.parquet"))
+        except OSError: return None
+
+    def _read(self, path):
+        try: return pd.read_parquet(path, memory_map=True)
+        except Exception: return None
+
+    # tmp 파일 → rename (읽는 쪽이 반쯤 쓴 파일을 보지 않도록)
+    def _write(self, path, df):
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        df.to_parquet(tmp); os.replace(tmp, path)
+
+    def read_listing(self, max_age=None):
+        path = os.path.join(self.root, "listing.parquet")
+        if max_age is not None and self._age(path) > max_age: return None
+        return self._read(path)
+
+    def write_listing(self, df):
+        path = os.path.join(self.root, "listing.parquet")
+        with self._key_lock(path): self._write(path, df)
+
+    # 종목별 일봉: 빠진 날짜만 받아서 이어 붙임 (마지막 봉은 장중 갱신분으로 교체)
+    def history(self, code, fetch=True):
+        path = os.path.join(self.root, "ohlcv", f"{code}.parquet")
+        with self._key_lock(path):
+            df = self._read(path)
+            if not fetch or self._age(path) < self.ttl: return df
+            start = df.index[-1] if df is not None and len(df) else datetime.now() - timedelta(days=HISTORY_DAYS)
+            try: new = fdr.DataReader(code, start.strftime('%Y-%m-%d'))
+            except Exception: return df
+            if new is None or new.empty:
+                if df is not None: os.utime(path)
+                return df
+            new = new.reindex(columns=OHLCV_COLS).astype({'Open': 'float32', 'High': 'float32', 'Low': 'float32', 'Close': 'float32', 'Volume': 'float64'})
+            df = new if df is None else pd.concat([df[df.index < new.index[0]], new])
+            self._write(path, df)
+            return df
+
+@st.cache_resource(show_spinner=False)
+def get_store():
+    return DataStore()
+
+# [핵심] 종목별 최신가 병렬 조회 (보유 종목 + 스캔 후보)
+class QuoteFetcher:
+    def __init__(self, store, workers=8, timeout=5.0, retries=2, ttl=60, window_days=7):
+        self.store = store; self.timeout = timeout; self.retries = retries; self.window_days = window_days
+        self.cache = TTLCache(maxsize=5000, ttl=ttl)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="quote")
+        self._inflight = {}; self._lock = threading.Lock()
+
+    # 최근 구간만 조회, 실패하면 재시도 후 디스크 일봉 종가로 대체
+    def _fetch_one(self, code):
+        start = (datetime.now() - timedelta(days=self.window_days)).strftime('%Y-%m-%d')
+        for attempt in range(self.retries + 1):
+            try:
+                df = fdr.DataReader(code, start)
+                price = float(df['Close'].iloc[-1]) if df is not None and len(df) else 0.0
+                if np.isfinite(price) and price > 0:
+                    self.cache.set(code, price); return price
+            except Exception: pass
+            if attempt < self.retries: time.sleep(0.3 * 2 ** attempt)
+        df = self.store.history(code, fetch=False)
+        return float(df['Close'].iloc[-1]) if df is not None and len(df) else None
+
+    def _done(self, code):
+        with self._lock: self._inflight.pop(code, None)
+
+    # 같은 종목 동시 요청은 진행 중인 Future 하나를 공유
+    def _submit(self, code):
+        with self._lock:
+            fut = self._inflight.get(code)
+            if fut is None:
+                fut = self.pool.submit(self._fetch_one, code); self._inflight[code] = fut
+                fut.add_done_callback(lambda _, c=code: self._done(c))
+            return fut
+
+    # 일봉 이력 병렬 증분 갱신 (디스크 저장소에 반영, 타임아웃 넘긴 건 다음 기회에)
+    # on_done(code): 타임아웃 뒤에 끝난 것까지 종목마다 완료 시 호출
+    @timed('history.warm')
+    def warm_history(self, codes, on_done=None):
+        futs = []
+        for c in set(codes):
+            fut = self.pool.submit(self.store.history, c); futs.append(fut)
+            if on_done: fut.add_done_callback(lambda _, c=c: on_done(c))
+        wait(futs, timeout=self.timeout)
+
+    @timed('quotes.latest')
+    def latest(self, codes):
+        out = {}; futs = {}
+        for c in set(codes):
+            hit = self.cache.get(c)
+            if hit is not None: out[c] = hit
+            else: futs[c] = self._submit(c)
+        # 전체 대기 시간 = 가장 느린 1건 (타임아웃 넘긴 건 None)
+        done, _ = wait(futs.values(), timeout=self.timeout)
+        for c, f in futs.items(): out[c] = f.result() if f in done else None
+        return out
+
+@st.cache_resource(show_spinner=False)
+def get_fetcher():
+    return QuoteFetcher(get_store())
+
+# 종목명 → 종목코드 (상장 목록이 없으면 빈 dict)
+def codes_for(names):
+    codes = get_name_index().codes
+    return {codes[n]: n for n in names if n in codes}
+
+def latest_prices(names):
+    by_code = codes_for(names)
+    quotes = get_fetcher().latest(by_code.keys())
+    return {by_code[c]: p for c, p in quotes.items() if p}
+
+# 받아진 종목은 지표 캐시에서 실측값을 다시 읽게 함
+def warm_history(names, extra=()):
+    by_code = codes_for(names); provider = get_metrics_provider()
+    def done(code):
+        if code in by_code: provider.forget([by_code[code]])
+    get_fetcher().warm_history([*by_code, *extra], done)
+
+# [핵심] 백그라운드 스케줄러 - 프로세스당 워커 스레드 1개
+# 세션은 want()로 원하는 주기를 등록(임대), 워커는 살아있는 요청 중 최소 주기로 작업 실행 → 결과는 공용 보관
+class Scheduler:
+    def __init__(self, tick=1.0):
+        self.tick = tick
+        self.jobs = {}; self.results = {}; self._wants = {}; self._last_run = {}
+        self._lock = threading.Lock(); self._run_locks = {}; self._thread = None
+
+    # 작업 등록 (스크립트 재실행마다 최신 함수로 덮어씀), default: 요청이 없어도 도는 주기
+    def register(self, job, fn, default=None):
+        with self._lock:
+            self.jobs[job] = (fn, default)
+            self._wants.setdefault(job, {}); self._last_run.setdefault(job, 0.0)
+            self._run_locks.setdefault(job, threading.Lock())
+        self.start()
+
+    def want(self, job, sid, interval):
+        with self._lock: self._wants.setdefault(job, {})[sid] = (interval, time.time())
+
+    # 임대 만료(주기 2배 + 여유) 세션은 정리
+    def interval(self, job, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            wants = self._wants.get(job, {})
+            for sid in [k for k, (iv, seen) in wants.items() if now - seen > iv * 2 + 60]: del wants[sid]
+            ivs = [iv for iv, _ in wants.values()]
+            default = self.jobs[job][1] if job in self.jobs else None
+        if default: ivs.append(default)
+        return min(ivs) if ivs else None
+
+    def run_now(self, job):
+        with self._run_locks[job]:
+            val = self.jobs[job][0]()
+            now = time.time(); self.results[job] = (now, val); self._last_run[job] = now
+        return self.results[job]
+
+    def latest(self, job):
+        return self.results.get(job)
+
+    def _loop(self):
+        while True:
+            time.sleep(self.tick)
+            now = time.time()
+            for job in list(self.jobs):
+                iv = self.interval(job, now)
+                if not iv or now - self._last_run[job] < iv: continue
+                try: self.run_now(job)
+                except Exception: self._last_run[job] = time.time()  # 실패해도 다음 주기까지 대기
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None: return
+            self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+            self._thread.start()
+
+@st.cache_resource(show_spinner=False)
+def get_scheduler():
+    return Scheduler()
+
+# [핵심] 시장 지수 공용 캐시 (세션마다 전체 이력 다운로드 금지)
+class IndexQuoteService:
+    SYMBOLS = {'kospi': 'KS11', 'kosdaq': 'KQ11'}
+
+    def __init__(self, window_days=14):
+        self.window_days = window_days
+        self.quote = None; self.updated = 0.0; self.attempted = 0.0
+        self._lock = threading.Lock()
+
+    # 최근 구간만 받아서 마지막 봉 사용
+    @timed('market.fetch')
+    def _fetch(self):
+        start = (datetime.now() - timedelta(days=self.window_days)).strftime('%Y-%m-%d')
+        out = {}
+        for key, sym in self.SYMBOLS.items():
+            df = fdr.DataReader(sym, start)
+            last = df.iloc[-1]
+            comp = last['Comp'] if 'Comp' in df else df['Close'].diff().iloc[-1]
+            out[key] = {'v': float(last['Close']), 'c': float(comp), 'r': float(last['Change'])}
+        return out
+
+    # 주기 갱신은 Scheduler 워커가 호출
+    def refresh(self):
+        self.attempted = time.time()
+        try: q = self._fetch()
+        except Exception: return self.quote
+        with self._lock: self.quote = q; self.updated = time.time()
+        return q
+
+    # block=False: 네트워크 없이 보관값만 (첫 화면은 기다리지 않고 워커/워밍업이 채움)
+    def get(self, block=True):
+        # 첫 조회 실패 시 세션마다 재시도하지 않도록 간격 제한
+        if block and self.quote is None and time.time() - self.attempted > 10: self.refresh()
+        return self.quote
+
+@st.cache_resource(show_spinner=False)
+def get_index_service():
+    return IndexQuoteService()
+
+def get_current_market(block=True):
+    return get_index_service().get(block)
+
+MARKET_REFRESH_SEC = 300
+MARKET_POLL_SEC = 2  # 첫 지수 도착 전까지 지수 바만 짧게 재확인
+MARKET_POLL_MAX = 30  # 최대 1분 남짓, 그 뒤로는 전체 재실행 때만 다시 확인
+get_scheduler().register('market', lambda: get_index_service().refresh(), default=MARKET_REFRESH_SEC)
+
+# [계측] 기록이 켜져 있으면 주기적으로 Prometheus 텍스트 파일 갱신 (textfile collector 수집용)
+TIMING_EXPORT_SEC = 60
+TIMING_JSONL = os.path.join(DATA_DIR, "timings.jsonl")
+TIMING_PROM = os.path.join(DATA_DIR, "timings.prom")
+
+def export_timings():
+    if TIMINGS.enabled: TIMINGS.export_prometheus(TIMING_PROM)
+
+get_scheduler().register('timings', export_timings, default=TIMING_EXPORT_SEC)
+
+# 세션은 공용 캐시만 읽음 (네트워크 호출 없음)
+def update_market_indices(block=True):
+    st.session_state.l_mkt = time.time()
+    st.session_state.market_data = get_current_market(block)
+
+# [핵심] KRX 상장 목록 스냅샷 (1회 다운로드 → 1회 필터 → 압축 컬럼)
+EXCLUDE_RE = re.compile('스팩|리츠|우|홀딩스|ET')
+FALLBACK_NAMES = ["삼성전자", "SK하이닉스", "LG에너지솔루션", "POSCO홀딩스", "NAVER", "카카오"]
+
+# 종목명 접두 검색 (정렬 키 + bisect, 종목코드로도 검색) - 결과는 시총 순
+class NameIndex:
+    def __init__(self, names, codes=None):
+        self.names = list(names); self.rank = {n: i for i, n in enumerate(self.names)}
+        self.codes = codes or {}  # 종목명 → 종목코드 (스냅샷당 1개, 조회는 dict 1번)
+        pairs = sorted([(n.lower(), n) for n in self.names] + [(c, n) for n, c in self.codes.items()])
+        self.keys = [k for k, _ in pairs]; self.vals = [n for _, n in pairs]
+
+    def search(self, prefix, limit=50):
+        p = (prefix or "").strip().lower()
+        if not p: return self.names[:limit]
+        lo = bisect.bisect_left(self.keys, p); hi = bisect.bisect_left(self.keys, p + "\uffff")
+        return sorted(dict.fromkeys(self.vals[lo:hi]), key=self.rank.get)[:limit]
+
+class ListingSnapshot:
+    def __init__(self, raw):
+        df = raw[~raw['Name'].str.contains(EXCLUDE_RE, na=True)]
+        df = pd.DataFrame({
+            'Code': df['Code'].astype(str), 'Name': df['Name'].astype(str),
+            'Market': df['Market'].astype('category'),
+            'Close': pd.to_numeric(df['Close'], errors='coerce').astype('float32'),
+            'Marcap': pd.to_numeric(df['Marcap'], errors='coerce').fillna(0).astype('int64'),
+        })
+        # 시총 내림차순 고정 → Top N은 head(n)
+        df = df.sort_values('Marcap', ascending=False, kind='stable', ignore_index=True)
+        df['Code'] = df['Code'].astype('category'); df['Name'] = df['Name'].astype('category')
+        self.df = df
+        self.names = df['Name'].astype(str).tolist()
+        self.codes = dict(zip(self.names, df['Code'].astype(str)))
+        self.index = NameIndex(self.names, self.codes)
+        self.loaded = time.time(); self.version = int(self.loaded * 1000)
+
+    # 디스크가 신선하면 네트워크 생략, 다운로드 실패 시 묵은 디스크본이라도 사용
+    @classmethod
+    @timed('listing.load')
+    def load(cls, store):
+        df = store.read_listing(max_age=3600)
+        if df is not None: return cls(df)
+        try:
+            snap = cls(fdr.StockListing('KRX'))
+        except Exception:
+            df = store.read_listing()
+            if df is None: raise
+            return cls(df)
+        try: store.write_listing(snap.df)
+        except Exception: pass  # 디스크 저장이 실패해도 받은 목록은 사용
+        return snap
+
+    def top(self, n):
+        return self.df.head(n)
+
+# 세션 공용 스냅샷 보관 (읽기 전용으로만 사용) - 1시간마다 새로 받고, 실패는 잠시 기억해서 호출마다 재다운로드하지 않음
+LISTING_TTL = 3600
+LISTING_RETRY_SEC = 60
+
+class ListingHolder:
+    def __init__(self, store, ttl=LISTING_TTL, retry=LISTING_RETRY_SEC):
+        self.store = store; self.ttl = ttl; self.retry = retry
+        self.snap = None; self.error = None; self.retry_at = 0.0
+        self.fallback = NameIndex(FALLBACK_NAMES)
+        self._lock = threading.Lock()
+
+    def _fresh(self, snap):
+        return snap is not None and time.time() - snap.loaded < self.ttl
+
+    # 신선한 스냅샷은 잠금 없이 반환, 갱신은 1개 스레드만 (기다린 쪽은 그 결과를 봄)
+    # 실패하면 retry초 동안은 묵은 스냅샷(없으면 같은 오류)으로 바로 응답
+    def get(self):
+        snap = self.snap
+        if self._fresh(snap): return snap
+        with self._lock:
+            snap = self.snap
+            if self._fresh(snap): return snap
+            if time.time() < self.retry_at:
+                if snap is not None: return snap
+                raise RuntimeError(f"상장 목록 없음: {self.error} ({self.retry_at - time.time():.0f}초 후 재시도)")
+            try:
+                self.snap = ListingSnapshot.load(self.store); self.error = None
+            except Exception as e:
+                self.error = e; self.retry_at = time.time() + self.retry
+                if snap is None: raise
+            return self.snap
+
+    # 목록이 없으면 기본 종목만 (종목코드 없음)
+    def index(self):
+        try: return self.get().index
+        except Exception: return self.fallback
+
+@st.cache_resource(show_spinner=False)
+def get_listing_holder():
+    return ListingHolder(get_store())
+
+def get_listing():
+    return get_listing_holder().get()
+
+# 종목명 위젯이 처음 그려질 때 목록 로드 (모듈 import 시점에는 다운로드하지 않음)
+def get_name_index():
+    return get_listing_holder().index()
+
+# 스캔 대상 (스냅샷 버전, 시총 순 종목 - 기본은 상장 전 종목)
+SCAN_TOP_N = None  # None = 상장 전 종목
+def load_universe(n=SCAN_TOP_N):
     try:
-        df = fdr.StockListing('KRX')
-        df = df[~df['Name'].str.contains('스팩|리츠|우|홀딩스|ET')]
-        return df['Name'].tolist()
-    except: return ["삼성전자", "SK하이닉스", "LG에너지솔루션", "POSCO홀딩스", "NAVER", "카카오"]
+        snap = get_listing(); return snap.version, (snap.df if n is None else snap.top(n))
+    except Exception: return None, pd.DataFrame()
 
-@st.cache_data(ttl=3600)
-def load_top50_data():
-    try:
-        df = fdr.StockListing('KRX')
-        df = df[~df['Name'].str.contains('스팩|리츠|우|홀딩스|ET')]
-        return df.sort_values(by='Marcap', ascending=False).head(50)
-    except: return pd.DataFrame()
+# 스캔 전에 일봉(네트워크)을 받아 두는 건 시총 상위 N개만 - 전 종목을 받으면 첫 스캔이 수천 건 다운로드를 기다리고
+# 보유 종목 시세 조회와 같은 풀을 막음, 나머지는 디스크에 있는 이력(없으면 합성 지표)으로 채점
+SCAN_WARM_N = 50
 
-stock_names = get_stock_list()
+def warm_universe(universe):
+    if not universe.empty: warm_history(universe['Name'].head(SCAN_WARM_N).tolist())
+
+SCAN_CHUNK = 512
+SCAN_STREAM_CHUNK = 128  # 버튼 스캔은 나눠서 진행 상황 표시 (전 종목 기준 20번 남짓)
+SCAN_POLL_SEC = 5
 # 요청하신 모든 시간 목록 반영
 TIME_OPTS = {
     "⛔ 멈춤": 0, "⏱️ 3분": 180, "⏱️ 5분": 300, "⏱️ 10분": 600, 
@@ -47,17 +462,25 @@ TIME_OPTS = {
     "⏱️ 1시간": 3600, "⏱️ 1시간 30분": 5400, "⏱️ 2시간": 7200, "⏱️ 3시간": 10800
 }
 
+# fragment 타이머는 직전 실행 '시작'부터 every초 뒤에 오므로 시작 시각을 기록하고 10% 여유를 둠
+# (엄격히 > every로 비교하면 타이머가 간발의 차로 한 번씩 건너뛰어 실제 주기가 2배가 됨)
+TIMER_SLACK = 0.1
+
+def timer_due(last, every):
+    return every > 0 and time.time() - last >= every * (1 - TIMER_SLACK)
+
 # Session State
 DEFAULT_STATE = {
     'portfolio': [], 'ideal_list': [], 'sc_list': [], 'sw_list': [],
     'cash': 10000000, 'target_return': 5.0, 'my_diagnosis': [],
-    'market_view_mode': None, 'port_analysis': None,
-    'l_my': 0, 'l_top3': 0, 'l_sep': 0, 'l_mkt': 0,
-    'trigger_my': False, 'trigger_top3': False, 'trigger_sep': False,
+    'market_view_mode': None, 'port_analysis': None, 'port_key': None, 'diag_memo': {},
+    'l_my': 0, 'l_scan': 0, 'l_top3': 0, 'l_sep': 0, 'l_mkt': 0, 'mkt_polls': 0,
+    'trigger_my': False, 'trigger_top3': False, 'trigger_sep': False, 'scan_cancelled': False,
     'market_data': None
 }
 for key, val in DEFAULT_STATE.items():
     if key not in st.session_state: st.session_state[key] = val
+if 'sid' not in st.session_state: st.session_state.sid = uuid.uuid4().hex
 
 # -----------------------------------------------------------------------------
 # [1] STYLING (Neon Gold & Dark)
@@ -115,11 +538,19 @@ st.markdown("""
 # -----------------------------------------------------------------------------
 st.markdown("<div class='main-title'>🐯 호찌와 햄찌의 퀀트 대작전 🐹</div>", unsafe_allow_html=True)
 
-c_m1, c_m2 = st.columns([3, 1])
-with c_m1:
-    if st.session_state.market_data is None: st.session_state.market_data = get_current_market()
-    md = st.session_state.market_data
-    if md:
+# 지수 바는 fragment로 자체 갱신 (전체 페이지 재실행 없음)
+def market_polling():
+    return st.session_state.market_data is None and st.session_state.mkt_polls < MARKET_POLL_MAX
+
+def market_bar():
+    ss = st.session_state
+    t_mkt = TIME_OPTS[ss.get('market_timer', "⛔ 멈춤")]
+    if t_mkt > 0: get_scheduler().want('market', ss.sid, t_mkt)
+    if ss.market_data is None or timer_due(ss.l_mkt, t_mkt): update_market_indices(block=False)
+    if ss.market_data is None: ss.mkt_polls += 1
+    md = ss.market_data
+    if not md: st.caption("📡 지수 불러오는 중..." if market_polling() else "📡 지수를 아직 못 불러왔어요 (화면을 다시 그리면 재확인)")
+    else:
         kp = md['kospi']; kd = md['kosdaq']
         kp_c = "up" if kp['c'] >= 0 else "down"; kd_c = "up" if kd['c'] >= 0 else "down"
         kp_s = "+" if kp['c'] >= 0 else ""; kd_s = "+" if kd['c'] >= 0 else ""
@@ -130,206 +561,113 @@ with c_m1:
         </div>
         """, unsafe_allow_html=True)
 
+c_m1, c_m2 = st.columns([3, 1])
+with c_m1:
+    # run_every는 전체 재실행 때만 다시 정해짐 - 지수가 온 뒤 다음 재실행(버튼/위젯)에서 짧은 재확인이 꺼지고,
+    # 그 전까지의 재확인은 공용 캐시만 보므로 비용 없음 (여기서 st.rerun을 부르면 같은 실행의 버튼 클릭이 사라짐)
+    t_bar = TIME_OPTS[st.session_state.get('market_timer', "⛔ 멈춤")]
+    st.fragment(market_bar, run_every=t_bar or (MARKET_POLL_SEC if market_polling() else None))()
+
 with c_m2:
     auto_market = st.selectbox("지수 갱신", list(TIME_OPTS.keys()), index=0, key="market_timer")
 
 # -----------------------------------------------------------------------------
 # [3] SINGULARITY OMEGA ENGINE (Deep Logic & Infinite Narrative)
 # -----------------------------------------------------------------------------
-class SingularityEngine:
-    def _calculate_metrics(self, name):
-        seed_val = zlib.crc32(f"{name}-{time.time()}".encode())
-        np.random.seed(seed_val)
-        return {
-            "omega": np.random.uniform(5.0, 30.0), "vol_surf": np.random.uniform(0.1, 0.9),
-            "betti": np.random.choice([0, 1], p=[0.85, 0.15]), "hurst": np.random.uniform(0.2, 0.99),
-            "te": np.random.uniform(0.1, 5.0), "vpin": np.random.uniform(0.0, 1.0),
-            "hawkes": np.random.uniform(0.1, 4.0), "obi": np.random.uniform(-1.0, 1.0),
-            "gnn": np.random.uniform(0.1, 1.0), "es": np.random.uniform(-0.01, -0.30), 
-            "kelly": np.random.uniform(0.01, 0.30)
-        }
-
-    def run_diagnosis(self, name, mode="swing"):
-        m = self._calculate_metrics(name)
-        score = 0.0; tags = []
-
-        # Physics & Math (JLS, Hawkes)
-        if 20.0 <= m['omega'] <= 28.0: score += 25; tags.append({'label': 'JLS 임계점', 'bg': '#00ff00'})
-        if m['hawkes'] > 2.2: score += 25; tags.append({'label': 'Hawkes 폭발', 'bg': '#00ff00'})
-        
-        # Network & Fractal (GNN, Hurst)
-        if m['gnn'] > 0.85: score += 20; tags.append({'label': 'GNN 대장주', 'bg': '#FFD700'})
-        if m['hurst'] > 0.65: score += 15; tags.append({'label': '추세 지속', 'bg': '#00ccff'})
-
-        # Risk (Penalty)
-        if m['vpin'] > 0.65: score -= 40; tags.append({'label': '⚠️ 독성 매물', 'bg': '#ff4444'})
-        if m['es'] < -0.20: score -= 25; tags.append({'label': '📉 Tail Risk', 'bg': '#ff4444'})
-        if m['betti'] == 1: score -= 25; tags.append({'label': '🌀 구조 붕괴', 'bg': '#ff4444'})
-
-        return max(0.0, min(100.0, score)) / 100.0, m, tags
-
-    # 🐹 햄찌: 메스가끼 + 쉬운 설명 + 구체적 분단위 지시
-    def _get_hamzzi_msg(self, wr, m, can_buy, target, price):
-        t_m1 = random.randint(1, 9); t_m2 = random.randint(10, 25); t_m3 = random.randint(30, 50)
-        
-        logic_variations = [
-            f"**JLS Omega**가 {m['omega']:.1f}Hz로 부르르 떨고 있어! (폭발 직전 진동수라는 뜻이야)",
-            f"**Hawkes 강도**가 {m['hawkes']:.2f}를 뚫었어! (기계들이 미친 듯이 매수 버튼 누른다는 뜻)",
-            f"**GNN 중심성** {m['gnn']:.2f} 실화냐? (시장 돈이 다 여기로 빨려 들어간다는 뜻)"
-        ]
-        
-        if wr >= 0.70:
-            return f"""
-            **[🐹 햄찌의 야수 본능: "쫄보야? 눈 떠!"]**
-            "야, 너 진짜 이거 안 살 거야? **[Singularity Omega]** 엔진이 비명을 지르잖아!
-            {random.choice(logic_variations)}
-            이건 단순 반등이 아니라 **'패러다임의 변화'**야. 지금 안 사면 평생 후회할걸?"
-            <div class='timetable-box'><b>⏰ 햄찌의 초단위 타임테이블</b><br>
-            1. <b>09:0{t_m1}</b>: 동시호가 갭상승 2% 이내면 <b>시장가 풀매수</b> ({can_buy}주)!<br>
-            2. <b>09:{t_m2}</b>: 눌림목(VWAP 지지)에서 <b>신용 미수</b> 불타기!<br>
-            3. <b>14:{t_m3}</b>: 상한가 문 닫으면 오버나잇, 아니면 <b>{target:,}원</b>에서 절반 챙겨.</div>
-            **👉 한줄 요약: 인생 역전 티켓이야! 쫄지 말고 질러!**
-            """
-        elif wr >= 0.50:
-            return f"""
-            **[🐹 햄찌의 단타 훈수: "짧게 먹고 튀어!"]**
-            "흥, 애매하네. **Hurst** {m['hurst']:.2f}라 추세는 있는데(한 번 가면 계속 가는 성질), **OBI**가 별로야(눈치 싸움 중).
-            세력들이 간 보고 있다는 증거지. 길게 가져가면 물린다?"
-            <div class='timetable-box'><b>⏰ 햄찌의 타임테이블</b><br>
-            1. <b>09:00</b>: 절대 진입 금지. 구경만 해.<br>
-            2. <b>10:{t_m2}</b>: <b>{price:,}원</b> 지지 시 <b>{int(can_buy/3)}주</b> 정찰병 투입.<br>
-            3. <b>13:{t_m3}</b>: 슈팅 나오면 뒤도 돌아보지 말고 전량 매도!</div>
-            **👉 한줄 요약: 욕심 부리지 마! 짧게 먹고 튀는 거야.**
-            """
-        else:
-            return f"""
-            **[🐹 햄찌의 경멸: "너 바보야?"]**
-            "야! **VPIN** {m['vpin']:.2f} 안 보여? (세력들이 물량 떠넘기는 설거지 수치라구!)
-            **Tail Risk**가 **{m['es']:.2f}**야. 내 돈 아니라고 막 쓰지 마!"
-            <div class='timetable-box'><b>⏰ 햄찌의 행동 지침</b><br>
-            1. <b>지금 당장</b>: <b>시장가 투매!</b> 탈출은 지능순이야.<br>
-            2. <b>장중 내내</b>: HTS 꺼. 쳐다보는 순간 뇌동매매한다.</div>
-            **👉 한줄 요약: 폭탄이야! 만지면 손목 날아가! 도망쳐!**
-            """
-
-    # 🐯 호찌: 꼰대 + 사자성어(뜻) + 학술적 설명
-    def _get_hojji_msg(self, wr, m, can_buy, target, price):
-        idiom_good = random.choice(["**금상첨화(錦上添花, 좋은 일 겹침)**", "**낭중지추(囊中之錐, 재능이 드러남)**"])
-        idiom_bad = random.choice(["**사상누각(砂上樓閣, 기초 부실)**", "**내우외환(內憂外患, 안팎으로 근심)**"])
-        
-        logic_good = f"**전이 엔트로피(TE)** 흐름이 양의 방향이야. (실적과 수급이 주가를 밀어 올리는 '실체 있는 상승'이란 말일세.)"
-        logic_bad = f"**비에르고딕(Non-Ergodic)** 파산 위험이 감지되었네. (여기서 물리면 자네 자산은 영원히 복구 불가능해.)"
-
-        if wr >= 0.70:
-            return f"""
-            **[🐯 호찌의 훈장님 말씀: "진국일세!"]**
-            "허허, {idiom_good}로세! {logic_good}
-            **JLS 모델**상으로도 버블 붕괴 위험은 낮으니 안심하게."
-            <div class='timetable-box'><b>⏳ 호찌의 행동 지침</b><br>
-            1. <b>진입 (14:15)</b>: 변동성이 줄어드는 오후, <b>{int(can_buy*0.8)}주</b> 분할 매수.<br>
-            2. <b>운용</b>: <b>{target:,}원</b>까지는 <b>'우보천리'</b>의 마음으로 홀딩.</div>
-            **👉 한줄 요약: 근본 있는 종목이야. 엉덩이 무겁게 들고 가시게.**
-            """
-        elif wr >= 0.50:
-            return f"""
-            **[🐯 호찌의 신중론: "돌다리도 두들겨 보게"]**
-            "음... 계륵일세. **국소 변동성** 표면이 거칠어. (투기적 자금이 들어와서 주가가 널뛸 수 있네.)
-            **'거안사위(편안할 때 위태로움을 생각함)'**의 자세가 필요하네."
-            <div class='timetable-box'><b>⏳ 호찌의 행동 지침</b><br>
-            1. <b>진입</b>: 오늘은 관망. 내일 시초가 확인 후 결정.<br>
-            2. <b>운용</b>: 정 사고 싶다면 <b>{int(can_buy*0.2)}주</b>만 소액으로.</div>
-            **👉 한줄 요약: 위험해 보이네. 리스크 관리가 최우선이야.**
-            """
-        else:
-            return f"""
-            **[🐯 호찌의 대호통: "썩은 동아줄이야!"]**
-            "어허! {idiom_bad}일세! {logic_bad}
-            **Going Concern(계속기업가치)**에 의문이 들어."
-            <div class='timetable-box'><b>⏳ 호찌의 행동 지침</b><br>
-            1. <b>즉시</b>: 포트폴리오에서 제외하게.<br>
-            2. <b>향후</b>: 펀더멘털 개선 전까진 쳐다도 보지 마.</div>
-            **👉 한줄 요약: 절대 잡지 마라. 잡으면 떨어진다네.**
-            """
-
-    def generate_report(self, mode, price, m, wr, cash, current_qty, target_return):
-        vol = m['vol_surf'] * 0.05
-        # Top 3는 절대 평가이므로 단타/스윙 모드는 내부적으로만 계산하여 최적값 도출
-        if mode == "scalping":
-            target = int(price * (1 + max(vol, 0.03)))
-            stop = int(price * (1 - vol * 0.5))
-            rationale = f"내재 변동성(Vol) {m['vol_surf']:.2f} 기반 1.5σ 상단 목표가, 0.5σ 하단 손절가 산출."
-            expected_yield = (target - price) / price * 100
-        else:
-            target = int(price * (1 + (target_return/100)))
-            stop = int(price * 0.93)
-            rationale = f"사용자 목표 수익률 {target_return}% 및 Hurst Exponent {m['hurst']:.2f}의 추세 지속성 반영."
-            expected_yield = target_return
-        
-        can_buy = int((cash * m['kelly'] * 0.5) / price) if price > 0 else 0
-        h_txt = self._get_hamzzi_msg(wr, m, can_buy, target, price)
-        t_txt = self._get_hojji_msg(wr, m, can_buy, target, price)
-
-        return {
-            "prices": (price, target, stop),
-            "hamzzi": h_txt, "hojji": t_txt, "rationale": rationale, "yield": expected_yield
-        }
-
-    def diagnose_portfolio(self, portfolio, cash):
-        if not portfolio: return "포트폴리오 없음", "데이터 없음"
-        total = cash + sum(s['price']*s['qty'] for s in portfolio)
-        cash_r = (cash/total*100) if total else 100
-        stock_cnt = len(portfolio)
-        beta = np.random.uniform(0.5, 2.0)
-        
-        h = f"""
-        **[🐹 햄찌의 계좌 팩트 폭격]**
-        "사장님! **예수금 {cash_r:.1f}%**? **[Cash Drag]**야! 돈이 썩고 있어!
-        지금 **Beta**가 **{beta:.2f}**밖에 안 돼. 내일 **레버리지** 태워서 시장 이겨야지! 쫄보야?"
-        """
-        t = f"""
-        **[🐯 호찌의 자산 배분 훈계]**
-        "자네, **보유 {stock_cnt}종목**... 너무 안일해. 종목 간 상관계수가 높아서 하락장 오면 '공멸'이야.
-        **[국채]**나 **[금]**을 편입해서 **'유비무환'**의 방어벽을 세우게."
-        """
-        return h, t
+# 엔진 본체(지표/채점/리포트/스캔)는 engine.py - Streamlit 없이 import 가능 (백테스트/벤치마크 공용)
+@st.cache_resource(show_spinner=False)
+def get_metrics_provider():
+    holder = get_listing_holder()
+    return MetricsProvider(MetricsBook(get_store()), resolve=lambda name: holder.index().codes.get(name))
+
+@st.cache_resource(show_spinner=False)
+def get_engine():
+    provider = get_metrics_provider()
+    return SingularityEngine(provider, PortfolioAnalytics(get_store(), provider.resolve))
+
+# [스캔] 공용 결과 - (유니버스 스냅샷, 버킷) 단위로 프로세스에서 1번만 계산
+# 예수금/목표 수익률은 리포트에만 쓰이므로 키에서 빼고 세션별 personalize()로 처리
+def scan_key(version):
+    return ('scan', version, data_bucket())
+
+def shared_scan():
+    version, universe = load_universe()
+    def compute():
+        warm_universe(universe)
+        return time.time(), scan_market(get_engine(), universe, None, latest_prices, SCAN_CHUNK)
+    return get_shared().get_or_compute(scan_key(version), compute)
+
+# [스캔] 버튼 스캔 - 청크마다 진행률/현재 Top 3 갱신, 끝나면 공용 보관소에 올림
+# 같은 키를 이미 계산 중이면(다른 세션 버튼/스케줄러/워밍업) 새로 돌리지 않고 그 결과를 기다림
+# 중지 버튼 = fragment 재실행 요청 → 진행 중인 루프는 다음 화면 갱신 시점에 중단 (기다리던 쪽은 이전 결과 유지)
+@timed('ui.scan_stream')
+def stream_scan():
+    version, universe = load_universe()
+    key = scan_key(version); shared = get_shared()
+    hit, fut, owner = shared.begin(key)
+    if hit is not None: return hit
+    if not owner:
+        with st.spinner("시장 전체 꿀통 찾는 중..."):
+            try: return shared.wait(fut)
+            except Exception: return None
+    try:
+        stop = st.empty(); bar = st.empty(); board = st.empty()
+        stop.button("⏹️ 스캔 중지", on_click=lambda: st.session_state.update(scan_cancelled=True))
+        bar.progress(0.0, text="일봉 준비 중..."); warm_universe(universe)
+        for done, total, boards in scan_stream(get_engine(), universe, None, SCAN_STREAM_CHUNK):
+            bar.progress(done / total if total else 1.0, text=f"시장 전체 꿀통 찾는 중... ({done}/{total})")
+            leaders = boards['ideal_list'].result()
+            if leaders: board.markdown("  \n".join(f"🏆 {i+1}위 **{x.name}** · AI Score {x.win * 100:.1f}" for i, x in enumerate(leaders)))
+        res = (time.time(), finish_scan(boards, latest_prices))
+    except BaseException as e:
+        shared.fail(key, fut, e); raise
+    shared.finish(key, fut, res)
+    stop.empty(); bar.empty(); board.empty()
+    return res
 
 # -----------------------------------------------------------------------------
 # [4] NATIVE UI RENDERER
 # -----------------------------------------------------------------------------
-def render_card(d, idx=None, is_rank=False):
-    win_pct = d['win'] * 100
-    p = d['plan']
-    m = d['m']
+@timed('ui.card')
+def render_card(d, idx=None, is_rank=False, key='my'):
+    win_pct = d.win * 100
+    p = d.plan
+    m = d.m
     
     with st.container(border=True):
         c1, c2 = st.columns([3, 1])
         with c1:
             prefix = f"🏆 {idx+1}위 " if is_rank else ""
             # 명예의 전당(is_rank=True)일 땐 단타/추세 라벨 제거 (절대 평가)
-            mode_badge = "" if is_rank else f"<span style='font-size:14px; color:#aaa;'>({d['mode']})</span>"
-            st.markdown(f"### {prefix}{d['name']} {mode_badge}", unsafe_allow_html=True)
+            mode_badge = "" if is_rank else f"<span style='font-size:14px; color:#aaa;'>({d.mode})</span>"
+            st.markdown(f"### {prefix}{d.name} {mode_badge}", unsafe_allow_html=True)
         with c2:
             st.metric("AI Score", f"{win_pct:.1f}", delta=None)
         
         st.progress(int(win_pct))
         
-        tcols = st.columns(len(d['tags']))
-        for i, tag in enumerate(d['tags']): tcols[i].caption(f"🏷️ {tag['label']}")
+        tags = get_engine().tags(d.tags)
+        if tags:
+            tcols = st.columns(len(tags))
+            for i, (label, _) in enumerate(tags): tcols[i].caption(f"🏷️ {label}")
         st.divider()
         
         i1, i2, i3 = st.columns(3)
-        if d.get('is_holding'):
-            pnl = d['pnl']
-            i1.metric("현재가", f"{d['price']:,}원"); i2.metric("현재 수익률", f"{pnl:.2f}%", delta=f"{pnl:.2f}%"); i3.metric("AI 목표가", f"{p['prices'][1]:,}원")
+        if d.is_holding:
+            pnl = d.pnl
+            i1.metric("현재가", f"{d.price:,}원"); i2.metric("현재 수익률", f"{pnl:.2f}%", delta=f"{pnl:.2f}%"); i3.metric("AI 목표가", f"{p.prices[1]:,}원")
         else:
-            ty = d['plan']['yield']
-            i1.metric("현재가", f"{d['price']:,}원"); i2.metric("예상 수익률", f"+{ty:.2f}%", delta=f"{ty:.2f}%"); i3.metric("AI 목표가", f"{p['prices'][1]:,}원")
+            ty = p.expected_yield
+            i1.metric("현재가", f"{d.price:,}원"); i2.metric("예상 수익률", f"+{ty:.2f}%", delta=f"{ty:.2f}%"); i3.metric("AI 목표가", f"{p.prices[1]:,}원")
         
-        st.markdown(f"<div class='rationale-box'>💡 {p['rationale']}</div>", unsafe_allow_html=True)
+        st.markdown(f"<div class='rationale-box'>💡 {p.rationale}</div>", unsafe_allow_html=True)
         
-        t1, t2, t3 = st.tabs(["🐹 햄찌", "🐯 호찌", "📊 8대 엔진"])
-        with t1: st.markdown(f"<div class='analysis-box box-hamzzi'>{d['hamzzi']}</div>", unsafe_allow_html=True)
-        with t2: st.markdown(f"<div class='analysis-box box-hojji'>{d['hojji']}</div>", unsafe_allow_html=True)
+        # 선택된 탭만 실행 (문구는 열린 탭에서만 생성)
+        t1, t2, t3 = st.tabs(["🐹 햄찌", "🐯 호찌", "📊 8대 엔진"], key=f"tabs_{key}_{idx}_{d.name}", on_change="rerun")
+        with t1:
+            if t1.open: st.markdown(f"<div class='analysis-box box-hamzzi'>{get_engine().narrative(p, 'hamzzi')}</div>", unsafe_allow_html=True)
+        with t2:
+            if t2.open: st.markdown(f"<div class='analysis-box box-hojji'>{get_engine().narrative(p, 'hojji')}</div>", unsafe_allow_html=True)
         with t3:
             st.markdown(f"""
             **1. Omega: {m['omega']:.1f}Hz** (15Hz↑ 폭발 임박 / JLS)<br>
@@ -361,7 +699,12 @@ with st.expander("💰 자산 및 포트폴리오 설정 (Click to Open)", expan
         for i, s in enumerate(st.session_state.portfolio):
             st.markdown(f"##### 📌 종목 {i+1}")
             cols = st.columns([3, 2, 2, 2, 1])
-            with cols[0]: s['name'] = st.selectbox("종목명", stock_names, index=0, key=f"n{i}", label_visibility="collapsed")
+            with cols[0]:
+                # 검색어 접두 일치 상위 50개만 옵션으로 (전체 목록을 행마다 보내지 않음), 현재 선택은 항상 포함
+                q = st.text_input("종목 검색", key=f"qn{i}", placeholder="🔎 종목명/코드 검색", label_visibility="collapsed")
+                opts = get_name_index().search(q)
+                if s['name'] and s['name'] not in opts: opts = [s['name'], *opts]
+                s['name'] = st.selectbox("종목명", opts, index=opts.index(s['name']) if s['name'] in opts else 0, key=f"n{i}", label_visibility="collapsed")
             # [UX Update] value=None으로 시작
             with cols[1]: s['price'] = st.number_input("평단가", value=float(s['price']) if s['price']>0 else None, key=f"p{i}", placeholder="평단가 입력")
             with cols[2]: s['qty'] = st.number_input("수량", value=int(s['qty']) if s['qty']>0 else None, key=f"q{i}", placeholder="수량 입력")
@@ -374,21 +717,67 @@ with st.expander("💰 자산 및 포트폴리오 설정 (Click to Open)", expan
 
 st.markdown("<div style='height:20px'></div>", unsafe_allow_html=True)
 
+# -----------------------------------------------------------------------------
+# [6] LIVE SECTIONS (fragment 단위 갱신 - 전체 페이지 재실행 없음)
+# -----------------------------------------------------------------------------
+engine = get_engine()
+sched = get_scheduler()
+sched.register('scan', shared_scan)
+
 c1, c2 = st.columns([2,1])
 with c1:
     if st.button("📊 햄찌와 호찌의 [계좌 정밀 진단] 시작"):
-        st.session_state.trigger_my = True; update_market_indices(); st.rerun()
+        st.session_state.trigger_my = True; update_market_indices()
 with c2:
     auto_my = st.selectbox("⏳ 자동 초기화", list(TIME_OPTS.keys()), index=0, key="main_timer")
 
-if st.session_state.my_diagnosis:
-    st.markdown("---")
-    if st.session_state.port_analysis:
-        h, t = st.session_state.port_analysis
-        st.subheader("📊 햄찌와 호찌의 계좌 참견")
-        st.markdown(f"<div class='analysis-box box-hamzzi'>{h}</div><div style='height:10px'></div><div class='analysis-box box-hojji'>{t}</div>", unsafe_allow_html=True)
-    st.subheader("🔎 내 종목 심층 분석")
-    for d in st.session_state.my_diagnosis: render_card(d, is_rank=False)
+# 종목별 결과는 (종목, 평단, 수량, 전략, 현재가, 예수금, 목표 수익률, 버킷) 단위 메모
+# 바뀐 종목 / 버킷 지난 종목만 다시 계산, 목록에서 빠진 종목은 메모에서도 정리
+@timed('ui.diagnose_my')
+def diagnose_my():
+    ss = st.session_state
+    ss.l_my = time.time()
+    held = [s['name'] for s in ss.portfolio if s['name']]
+    warm_history(held, PortfolioAnalytics.INDEXES); live = latest_prices(held)
+    bucket = data_bucket()
+    memo = ss.diag_memo; fresh = {}; my_res = []
+    for s in ss.portfolio:
+        if not s['name']: continue
+        mode = "scalping" if s['strategy'] == "초단타" else "swing"
+        price = int(live[s['name']]) if s['name'] in live else (int(s['price']) if s['price'] > 0 else 10000)
+        key = (s['name'], s['price'], s['qty'], s['strategy'], price, ss.cash, ss.target_return, bucket)
+        d = fresh.get(key) or memo.get(key)
+        if d is None:
+            wr, m, tags = engine.run_diagnosis(s['name'], mode)
+            plan = engine.generate_report(mode, price, m, wr, ss.cash, s['qty'], ss.target_return, s['name'])
+            pnl = ((price - s['price'])/s['price']*100) if s['price']>0 else 0
+            d = Pick(s['name'], price, wr, m, tags, mode, plan, pnl, is_holding=True)
+        fresh[key] = d; my_res.append(d)
+    ss.diag_memo = fresh
+    ss.my_diagnosis = my_res
+
+    # 계좌 총평: 평가 구성(종목, 가격, 수량)/예수금/버킷이 그대로면 재사용
+    port_key = (tuple((s['name'], live.get(s['name'], s['price']), s['qty']) for s in ss.portfolio if s['name']), ss.cash, bucket)
+    if port_key != ss.port_key:
+        ss.port_analysis = engine.diagnose_portfolio(ss.portfolio, ss.cash, live); ss.port_key = port_key
+    ss.trigger_my = False
+
+# 계좌 진단: 자동 초기화 주기마다 이 구역만 재실행
+@timed('ui.my_section')
+def my_section():
+    t_my = TIME_OPTS[st.session_state.main_timer]
+    if st.session_state.trigger_my or timer_due(st.session_state.l_my, t_my):
+        with st.spinner("햄찌와 호찌가 계좌를 뜯어보는 중..."): diagnose_my()
+    if st.session_state.my_diagnosis:
+        st.markdown("---")
+        if st.session_state.port_analysis:
+            h, t = st.session_state.port_analysis
+            st.subheader("📊 햄찌와 호찌의 계좌 참견")
+            st.markdown(f"<div class='analysis-box box-hamzzi'>{h}</div><div style='height:10px'></div><div class='analysis-box box-hojji'>{t}</div>", unsafe_allow_html=True)
+        st.subheader("🔎 내 종목 심층 분석")
+        for i, d in enumerate(st.session_state.my_diagnosis): render_card(d, i, is_rank=False)
+
+st.fragment(my_section, run_every=TIME_OPTS[auto_my] or None)()
 
 st.markdown("<br><hr style='border-top: 1px dashed #333; margin: 30px 0;'><br>", unsafe_allow_html=True)
 st.markdown("### 📡 햄찌의 꿀통 발견 (시장 스캔)")
@@ -396,90 +785,92 @@ st.markdown("### 📡 햄찌의 꿀통 발견 (시장 스캔)")
 c1, c2 = st.columns(2)
 with c1:
     if st.button("🏆 명예의 전당 (Top 3)"):
-        st.session_state.trigger_top3 = True; update_market_indices(); st.session_state.market_view_mode = 'TOP3'; st.rerun()
+        st.session_state.trigger_top3 = True; update_market_indices(); st.session_state.market_view_mode = 'TOP3'
     auto_top3 = st.selectbox("Top3 갱신", list(TIME_OPTS.keys()), index=0, key="top3_timer")
 
 with c2:
     if st.button("⚡ 단타 야수 vs 🌊 묵직 꼰대"):
-        st.session_state.trigger_sep = True; update_market_indices(); st.session_state.market_view_mode = 'SEPARATE'; st.rerun()
+        st.session_state.trigger_sep = True; update_market_indices(); st.session_state.market_view_mode = 'SEPARATE'
     auto_sep = st.selectbox("전략별 갱신", list(TIME_OPTS.keys()), index=0, key="sep_timer")
 
-if st.session_state.market_view_mode == 'TOP3' and st.session_state.ideal_list:
-    st.markdown("#### 🏆 명예의 전당 (AI Score 최상위)")
-    for i, d in enumerate(st.session_state.ideal_list): render_card(d, i, is_rank=True)
-
-elif st.session_state.market_view_mode == 'SEPARATE' and st.session_state.sc_list:
-    st.markdown("#### 📊 전략별 절대 랭킹")
-    t1, t2 = st.tabs(["⚡ 햄찌의 단타 픽", "🌊 호찌의 스윙 픽"])
-    with t1:
-        for i, d in enumerate(st.session_state.sc_list): render_card(d, i, is_rank=True)
-    with t2:
-        for i, d in enumerate(st.session_state.sw_list): render_card(d, i, is_rank=True)
-
-# [6] LOGIC LOOP
-engine = SingularityEngine()
-now = time.time()
-need_rerun = False
-
-t_mkt = TIME_OPTS[auto_market]
-if t_mkt > 0 and now - st.session_state.last_market_update > t_mkt:
-    update_market_indices(); need_rerun = True
-
-t_my = TIME_OPTS[auto_my]
-if st.session_state.trigger_my or (t_my > 0 and now - st.session_state.l_my > t_my):
-    with st.spinner("햄찌와 호찌가 계좌를 뜯어보는 중..."):
-        h_p, t_p = engine.diagnose_portfolio(st.session_state.portfolio, st.session_state.cash)
-        st.session_state.port_analysis = (h_p, t_p)
-        my_res = []
-        for s in st.session_state.portfolio:
-            if not s['name']: continue
-            mode = "scalping" if s['strategy'] == "초단타" else "swing"
-            price = int(s['price']) if s['price'] > 0 else 10000
-            wr, m, tags = engine.run_diagnosis(s['name'], mode)
-            plan = engine.generate_report(mode, price, m, wr, st.session_state.cash, s['qty'], st.session_state.target_return)
-            pnl = ((price - s['price'])/s['price']*100) if s['price']>0 else 0
-            my_res.append({
-                'name': s['name'], 'price': price, 'pnl': pnl, 'win': wr, 
-                'm': m, 'tags': tags, 'plan': plan, 'mode': mode, 'is_holding': True,
-                'hamzzi': plan['hamzzi'], 'hojji': plan['hojji']
-            })
-        st.session_state.my_diagnosis = my_res
-        st.session_state.l_my = now
-        st.session_state.trigger_my = False
-        need_rerun = True
-
-t_top3 = TIME_OPTS[auto_top3]
-t_sep = TIME_OPTS[auto_sep]
-scan_needed = False
-if st.session_state.trigger_top3 or (t_top3 > 0 and now - st.session_state.l_top3 > t_top3):
-    scan_needed = True; st.session_state.market_view_mode = 'TOP3'; st.session_state.trigger_top3 = False; st.session_state.l_top3 = now
-if st.session_state.trigger_sep or (t_sep > 0 and now - st.session_state.l_sep > t_sep):
-    scan_needed = True; st.session_state.market_view_mode = 'SEPARATE'; st.session_state.trigger_sep = False; st.session_state.l_sep = now
-
-if scan_needed:
-    with st.spinner("시장 전체 꿀통 찾는 중..."):
-        market_data = load_top50_data()
-        sc, sw, ideal = [], [], []
-        for _, row in market_data.iterrows():
-            if pd.isna(row['Close']): continue
-            price = int(float(row['Close'])); name = row['Name']
-            
-            # Scalping & Swing Analysis
-            wr1, m1, t1 = engine.run_diagnosis(name, "scalping")
-            p1 = engine.generate_report("scalping", price, m1, wr1, st.session_state.cash, 0, st.session_state.target_return)
-            item1 = {'name': name, 'price': price, 'win': wr1, 'm': m1, 'tags': t1, 'plan': p1, 'mode': '초단타', 'is_holding': False, 'hamzzi': p1['hamzzi'], 'hojji': p1['hojji']}
-            
-            wr2, m2, t2 = engine.run_diagnosis(name, "swing")
-            p2 = engine.generate_report("swing", price, m2, wr2, st.session_state.cash, 0, st.session_state.target_return)
-            item2 = {'name': name, 'price': price, 'win': wr2, 'm': m2, 'tags': t2, 'plan': p2, 'mode': '추세추종', 'is_holding': False, 'hamzzi': p2['hamzzi'], 'hojji': p2['hojji']}
-            
-            sc.append(item1); sw.append(item2)
-            # [Top 3 Absolute] Pick better mode for Hall of Fame
-            ideal.append(item1 if wr1 >= wr2 else item2)
-            
-        sc.sort(key=lambda x: x['win'], reverse=True); sw.sort(key=lambda x: x['win'], reverse=True); ideal.sort(key=lambda x: x['win'], reverse=True)
-        st.session_state.sc_list = sc[:3]; st.session_state.sw_list = sw[:3]; st.session_state.ideal_list = ideal[:3]
-        need_rerun = True
+# 시장 스캔: 워커가 공용 보관소에 올린 결과를 짧은 주기로 확인해 이 구역만 갱신
+@timed('ui.scan_section')
+def scan_section():
+    t_top3 = TIME_OPTS[st.session_state.top3_timer]; t_sep = TIME_OPTS[st.session_state.sep_timer]
+    autos = [t for t in (t_top3, t_sep) if t > 0]
+    if autos: sched.want('scan', st.session_state.sid, min(autos))
+
+    # 공용 작업은 세션들 중 최소 주기로 돌지만, 가져오기/화면 전환은 이 세션 자신의 주기대로 (3시간 세션이 남의 3분 주기를 따라가지 않도록)
+    due = {lane: st.session_state.get(f'trigger_{lane}') or timer_due(st.session_state[f'l_{lane}'], t)
+           for lane, t in (('top3', t_top3), ('sep', t_sep))}
+    triggered = st.session_state.trigger_top3 or st.session_state.trigger_sep
+    if st.session_state.scan_cancelled:
+        st.caption("⏹️ 스캔을 중지했어요. 이전 결과를 보여드릴게요.")
+        st.session_state.scan_cancelled = False
+    if triggered:
+        # 중지로 재실행돼도 다시 시작하지 않도록 먼저 내림
+        st.session_state.trigger_top3 = False; st.session_state.trigger_sep = False
+        res = stream_scan()
+    else:
+        res = sched.latest('scan'); res = res[1] if res else None
+
+    # res = (계산 시각, 공용 픽) - 주기가 도래하면 화면 전환, 세션 리포트는 새 결과일 때만 생성
+    if res and (triggered or any(due.values())):
+        if triggered or res[0] > st.session_state.l_scan:
+            picked = personalize(engine, res[1], st.session_state.cash, st.session_state.target_return)
+            for key, items in picked.items(): st.session_state[key] = items
+            st.session_state.l_scan = res[0]
+        now = time.time()
+        # 둘 다 도래하면 전략별 화면 (기존 순서 그대로)
+        for lane, mode in (('top3', 'TOP3'), ('sep', 'SEPARATE')):
+            if due[lane]: st.session_state[f'l_{lane}'] = now; st.session_state.market_view_mode = mode
+
+    if st.session_state.market_view_mode == 'TOP3' and st.session_state.ideal_list:
+        st.markdown("#### 🏆 명예의 전당 (AI Score 최상위)")
+        for i, d in enumerate(st.session_state.ideal_list): render_card(d, i, is_rank=True, key='top3')
+
+    elif st.session_state.market_view_mode == 'SEPARATE' and st.session_state.sc_list:
+        st.markdown("#### 📊 전략별 절대 랭킹")
+        t1, t2 = st.tabs(["⚡ 햄찌의 단타 픽", "🌊 호찌의 스윙 픽"])
+        with t1:
+            for i, d in enumerate(st.session_state.sc_list): render_card(d, i, is_rank=True, key='sc')
+        with t2:
+            for i, d in enumerate(st.session_state.sw_list): render_card(d, i, is_rank=True, key='sw')
+
+st.fragment(scan_section, run_every=SCAN_POLL_SEC if TIME_OPTS[auto_top3] or TIME_OPTS[auto_sep] else None)()
+
+# 첫 화면을 그린 뒤 프로세스당 1번: 상장 목록 → 지수 → 스캔 대상 이력/지표 + 공용 스캔 결과
+def warm_caches():
+    for step in (get_listing, get_current_market, shared_scan):
+        try: step()
+        except Exception: pass
+
+@st.cache_resource(show_spinner=False)
+def start_warmup():
+    t = threading.Thread(target=warm_caches, name="warmup", daemon=True); t.start()
+    return t
+
+start_warmup()
+
+# -----------------------------------------------------------------------------
+# [7] ADMIN DIAGNOSTICS (?admin=1 또는 HH_ADMIN=1 일 때만 표시)
+# -----------------------------------------------------------------------------
+if st.query_params.get("admin") == "1" or os.environ.get("HH_ADMIN"):
+    with st.expander("🛠️ 단계별 소요 시간 (관리자)"):
+        if st.button("⏸️ 기록 끄기" if TIMINGS.enabled else "⏺️ 기록 켜기"):
+            TIMINGS.enabled = not TIMINGS.enabled; st.rerun()
+        summ = TIMINGS.summary()
+        if summ:
+            df = pd.DataFrame(summ).T.sort_values('sum', ascending=False)
+            st.dataframe(pd.DataFrame({
+                '호출': df['count'].astype(int), 'p50 (ms)': df['p50'] * 1e3, 'p95 (ms)': df['p95'] * 1e3,
+                'max (ms)': df['max'] * 1e3, '합계 (s)': df['sum'],
+            }).round(2), width='stretch')
+        else:
+            st.caption("기록 없음 - 기록을 켜고 화면을 조작해 보세요.")
+        b1, b2, b3 = st.columns(3)
+        if b1.button("JSONL 내보내기"): TIMINGS.export_jsonl(TIMING_JSONL); st.toast(TIMING_JSONL)
+        if b2.button("Prometheus 내보내기"): TIMINGS.export_prometheus(TIMING_PROM); st.toast(TIMING_PROM)
+        if b3.button("기록 비우기"): TIMINGS.clear(); st.rerun()
 
-if need_rerun: st.rerun()
-if any(x > 0 for x in [t_val_my, t_top3, t_sep, t_mkt]): time.sleep(1); st.rerun()
+if TIMINGS.enabled: TIMINGS.record('ui.script', time.perf_counter() - _script_t0)
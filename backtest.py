@@ -0,0 +1,171 @@
+import argparse
+import itertools
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from engine import RULE_PARAMS, PortfolioAnalytics, RollingMetrics, SingularityEngine, make_rules, plan_levels
+
+# -----------------------------------------------------------------------------
+# BACKTEST - 저장된 일봉으로 채점 규칙 + 목표가/손절가 규칙 재현 (UI 없이 실행)
+#   python backtest.py --universe 500 --sweep hawkes=1.8,2.2,2.6 --sweep min_score=0.25,0.4 --jobs 4
+# -----------------------------------------------------------------------------
+DATA_DIR = os.environ.get("HH_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data"))
+
+# 모드별 최대 보유 일수 / 기본 실행 파라미터 (RULE_PARAMS 키와 함께 --sweep 대상)
+HORIZON = {'scalping': 1, 'swing': 20}
+SIM_PARAMS = {'min_score': 0.25, 'top': 0, 'target_return': 5.0, 'fee': 0.0025, 'horizon': 0}
+
+# [패널] 종목별 parquet → (날짜, 종목) 행렬
+# 상장 목록이 있으면 목록에 있는 종목만 시총 순, 없으면 저장된 파일 전부 - 계좌 진단용 지수 이력(KS11/KQ11)은 항상 제외
+def load_panel(root=DATA_DIR, codes=None, universe=None, start=None, end=None):
+    ohlcv = os.path.join(root, "ohlcv")
+    if codes is None:
+        have = {f[:-8] for f in os.listdir(ohlcv) if f.endswith(".parquet")} if os.path.isdir(ohlcv) else set()
+        have -= set(PortfolioAnalytics.INDEXES)
+        listing = os.path.join(root, "listing.parquet")
+        if os.path.exists(listing): codes = [c for c in pd.read_parquet(listing)['Code'].astype(str) if c in have]
+        else: codes = sorted(have)
+    if universe: codes = codes[:universe]
+    frames = {}
+    for c in codes:
+        try: frames[c] = pd.read_parquet(os.path.join(ohlcv, f"{c}.parquet"), memory_map=True)
+        except Exception: continue
+    if not frames: raise SystemExit(f"{ohlcv}: 일봉 데이터 없음 (앱을 한 번 실행해 저장소를 채우세요)")
+    df = pd.concat(frames, axis=1).sort_index()
+    if start: df = df[df.index >= pd.Timestamp(start)]
+    if end: df = df[df.index <= pd.Timestamp(end)]
+    panel = {k: df.xs(k, axis=1, level=1).to_numpy(dtype=float) for k in ('Open', 'High', 'Low', 'Close', 'Volume')}
+    panel['dates'] = df.index.to_numpy(); panel['codes'] = list(frames)
+    return panel
+
+# [지표] 날짜 순서대로 전 종목 1봉씩 - 임계값과 무관하므로 스윕 전체에서 1번만 계산
+# OHLCV로 만들 수 없는 지표(omega/gnn/te/obi/betti)는 NaN → 해당 규칙은 발동하지 않음
+def compute_metrics(panel, **kw):
+    close, volume = panel['Close'], panel['Volume']
+    T, N = close.shape
+    rm = RollingMetrics(N, **kw)
+    out = {k: np.empty((T, N), dtype=np.float32) for k in RollingMetrics.KEYS}
+    for t in range(T):
+        rm.update(close[t], volume[t])
+        for k, v in rm.snapshot().items(): out[k][t] = v
+    nan = np.full((T, N), np.nan, dtype=np.float32)
+    for k in ('omega', 'te', 'obi', 'gnn', 'betti'): out[k] = nan
+    return out
+
+def _fwd(a, k):
+    out = np.full_like(a, np.nan); out[:-k] = a[k:]
+    return out
+
+# [시뮬레이션] t일 종가까지 보고 채점 → t+1일 시가 진입 → 목표가/손절가/만기 중 먼저 오는 쪽 청산
+# 같은 날 목표/손절 둘 다 닿으면 손절로 간주 (보수적), 갭은 시가로 체결
+def simulate(panel, metrics, mode, params):
+    p = {**SIM_PARAMS, **params}
+    rules = make_rules(**{k: v for k, v in p.items() if k in RULE_PARAMS})
+    score = SingularityEngine(rules=rules)._score(metrics)
+    sig = (score >= p['min_score']) & np.isfinite(metrics['hurst'])
+    if p['top']:
+        rank = np.argsort(np.argsort(-np.where(sig, score, -np.inf), axis=1, kind='stable'), axis=1)
+        sig &= rank < p['top']
+
+    entry = _fwd(panel['Open'], 1)
+    sig &= np.isfinite(entry) & (entry > 0)
+    entry = np.where(sig, entry, np.nan)
+    target, stop = plan_levels(mode, entry, metrics['vol_surf'], p['target_return'])
+    H = int(p['horizon'] or HORIZON[mode])
+
+    exit_px = np.full_like(entry, np.nan); how = np.zeros(entry.shape, dtype=np.int8)
+    alive = sig.copy()
+    for k in range(1, H + 1):
+        op, hi, lo, cl = (_fwd(panel[c], k) for c in ('Open', 'High', 'Low', 'Close'))
+        with np.errstate(invalid='ignore'):
+            hit_stop = alive & (lo <= stop)
+            hit_tgt = alive & ~hit_stop & (hi >= target)
+        exit_px = np.where(hit_stop, np.fmin(op, stop), exit_px)
+        exit_px = np.where(hit_tgt, np.fmax(op, target), exit_px)
+        how[hit_stop] = -1; how[hit_tgt] = 1
+        alive &= ~(hit_stop | hit_tgt)
+        if k == H: exit_px = np.where(alive, cl, exit_px)
+
+    ret = exit_px / entry - 1 - p['fee']
+    return ret, how
+
+# 거래 통계 + 자본 곡선 (진입일마다 자본의 1/H 투입하는 분산 진입 가정)
+def summarize(ret, how, H):
+    ok = np.isfinite(ret); r = ret[ok]
+    n_day = ok.sum(axis=1)
+    daily = np.where(n_day > 0, np.nansum(np.where(ok, ret, 0.0), axis=1) / np.maximum(n_day, 1), 0.0)
+    equity = np.cumprod(1 + daily / H)
+    dd = equity / np.maximum.accumulate(equity) - 1 if len(equity) else np.zeros(1)
+    years = max(len(equity) / 252, 1e-9)
+    return {
+        'trades': int(ok.sum()), 'hit_rate': float((r > 0).mean()) if len(r) else np.nan,
+        'target_rate': float((how[ok] == 1).mean()) if len(r) else np.nan,
+        'stop_rate': float((how[ok] == -1).mean()) if len(r) else np.nan,
+        'avg_ret': float(r.mean()) if len(r) else np.nan, 'med_ret': float(np.median(r)) if len(r) else np.nan,
+        'total_ret': float(equity[-1] - 1) if len(equity) else 0.0,
+        'cagr': float(equity[-1] ** (1 / years) - 1) if len(equity) else 0.0,
+        'max_dd': float(dd.min()),
+    }
+
+def run_one(panel, metrics, mode, params):
+    ret, how = simulate(panel, metrics, mode, params)
+    H = int(params.get('horizon') or HORIZON[mode])
+    return {'mode': mode, **params, **summarize(ret, how, H)}
+
+# 프로세스 풀: 패널/지표는 워커 시작 시 1번만 전달
+_SHARED = {}
+def _init(panel, metrics):
+    _SHARED['panel'] = panel; _SHARED['metrics'] = metrics
+
+def _run_shared(args):
+    return run_one(_SHARED['panel'], _SHARED['metrics'], *args)
+
+def sweep(panel, metrics, modes, grid, jobs=1):
+    keys = list(grid)
+    tasks = [(mode, dict(zip(keys, vals))) for mode in modes for vals in itertools.product(*grid.values())]
+    if jobs <= 1 or len(tasks) == 1:
+        return pd.DataFrame([run_one(panel, metrics, *t) for t in tasks])
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init, initargs=(panel, metrics)) as pool:
+        return pd.DataFrame(list(pool.map(_run_shared, tasks)))
+
+def parse_grid(specs):
+    known = {**RULE_PARAMS, **SIM_PARAMS}
+    grid = {}
+    for spec in specs or []:
+        key, _, vals = spec.partition('=')
+        if key not in known: raise SystemExit(f"알 수 없는 파라미터: {key} (가능: {', '.join(known)})")
+        grid[key] = [type(known[key])(v) for v in vals.split(',')]
+    return grid
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Hojji & Hamzzi 채점 규칙 백테스트 (저장된 일봉 재현)")
+    ap.add_argument('--data', default=DATA_DIR, help="저장소 경로 (기본: HH_DATA_DIR 또는 .data)")
+    ap.add_argument('--codes', nargs='*', help="종목코드 목록 (기본: 저장된 전 종목)")
+    ap.add_argument('--universe', type=int, help="시총 상위 N 종목만")
+    ap.add_argument('--start'); ap.add_argument('--end')
+    ap.add_argument('--mode', choices=['scalping', 'swing', 'both'], default='both')
+    ap.add_argument('--sweep', action='append', metavar="KEY=V1,V2", help="파라미터 격자 (여러 번 지정 가능)")
+    ap.add_argument('--jobs', type=int, default=1, help="파라미터 조합 병렬 프로세스 수")
+    ap.add_argument('--out', help="결과 CSV 경로")
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    panel = load_panel(args.data, args.codes, args.universe, args.start, args.end)
+    t1 = time.perf_counter()
+    metrics = compute_metrics(panel)
+    t2 = time.perf_counter()
+    modes = ['scalping', 'swing'] if args.mode == 'both' else [args.mode]
+    res = sweep(panel, metrics, modes, parse_grid(args.sweep), args.jobs)
+    t3 = time.perf_counter()
+
+    T, N = panel['Close'].shape
+    print(f"{N}종목 x {T}일 | 로드 {t1 - t0:.2f}s, 지표 {t2 - t1:.2f}s, 시뮬레이션 {len(res)}건 {t3 - t2:.2f}s")
+    with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.float_format', '{:.4f}'.format):
+        print(res.to_string(index=False))
+    if args.out: res.to_csv(args.out, index=False)
+    return res
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from engine import MetricsBook, MetricsProvider, PortfolioAnalytics, SingularityEngine, scan_market, personalize
+
+# -----------------------------------------------------------------------------
+# BENCHMARK - 합성 상장 목록/일봉으로 엔진 + 스캔 경로의 규모별 지연/처리량/메모리 측정
+#   python bench.py --sizes 50,500,2500 --json bench.json
+#   python bench.py --compare bench.json   (기준 대비 느려지거나 메모리 늘면 exit 1)
+# -----------------------------------------------------------------------------
+SIZES = (50, 500, 2500)
+INDEXES = PortfolioAnalytics.INDEXES
+
+# [픽스처] 합성 일봉 저장소 - DataStore.history(code, fetch=False)와 같은 모양, 네트워크/디스크 없음
+class SyntheticStore:
+    def __init__(self, codes, days=300, seed=0):
+        rng = np.random.default_rng(seed)
+        n = len(codes)
+        # 어제까지 (MetricsBook은 오늘 봉을 제외)
+        idx = pd.bdate_range(end=datetime.now().date() - timedelta(days=1), periods=days)
+        close = 10000 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, (days, n)), axis=0))
+        vol = rng.lognormal(12, 0.6, (days, n))
+        self.frames = {}
+        for j, c in enumerate(codes):
+            cl = close[:, j].astype('float32')
+            self.frames[c] = pd.DataFrame({'Open': cl, 'High': cl * 1.01, 'Low': cl * 0.99, 'Close': cl, 'Volume': vol[:, j]}, index=idx)
+
+    def history(self, code, fetch=True):
+        return self.frames.get(code)
+
+def make_listing(n, seed=0):
+    rng = np.random.default_rng(seed)
+    codes = [f"{i:06d}" for i in range(n)]
+    return pd.DataFrame({
+        'Code': codes, 'Name': [f"종목{i:05d}" for i in range(n)],
+        'Market': pd.Categorical(rng.choice(['KOSPI', 'KOSDAQ'], n)),
+        'Close': rng.uniform(1000, 200000, n).astype('float32'),
+        'Marcap': np.sort(rng.integers(10**10, 10**14, n))[::-1],
+    })
+
+class Fixture:
+    def __init__(self, n):
+        self.listing = make_listing(n)
+        self.names = self.listing['Name'].tolist()
+        self.codes = dict(zip(self.names, self.listing['Code']))
+        self.store = SyntheticStore([*self.listing['Code'], *INDEXES])
+        self.portfolio = [{'name': nm, 'price': 10000, 'qty': 10, 'strategy': '추세추종'} for nm in self.names]
+        self.book = None
+
+    # 매번 새 엔진 (지표/문구/계좌 캐시 비어 있는 상태 = cold)
+    # 종목별 롤링 상태(MetricsBook)는 앱처럼 프로세스 수명 동안 유지 → 공유, 워밍업 비용은 metrics_warmup 케이스로 따로 측정
+    def engine(self):
+        if self.book is None:
+            self.book = MetricsBook(self.store); self.book.get_many(self.codes.values())
+        provider = MetricsProvider(self.book, resolve=self.codes.get)
+        return SingularityEngine(provider, PortfolioAnalytics(self.store, self.codes.get))
+
+# [케이스] (이름, 준비 함수) - 준비 함수는 (실행 함수, 호출 수) 반환
+# cold = 새 MetricsBook에 250봉 워밍업, warm = 새 봉 없는 재조회
+def case_metrics_warmup(fx):
+    book = MetricsBook(fx.store)
+    return (lambda: book.get_many(fx.codes.values())), len(fx.codes)
+
+# 종목 1개씩 워밍업 (화면에서 보유 종목 1개 진단할 때의 경로)
+def case_metrics_warmup_single(fx):
+    book = MetricsBook(fx.store)
+    return (lambda: [book.get(c) for c in fx.codes.values()]), len(fx.codes)
+
+def case_run_diagnosis(fx):
+    eng = fx.engine()
+    return (lambda: [eng.run_diagnosis(nm, "swing") for nm in fx.names]), len(fx.names)
+
+def case_run_diagnosis_batch(fx):
+    eng = fx.engine()
+    return (lambda: eng.run_diagnosis_batch(fx.names)), 1
+
+def case_generate_report(fx):
+    eng = fx.engine()
+    ms = [eng.run_diagnosis(nm, "swing") for nm in fx.names]
+    return (lambda: [eng.generate_report("swing", 10000, m, wr, 10000000, 0, 5.0, nm) for nm, (wr, m, _) in zip(fx.names, ms)]), len(fx.names)
+
+def case_diagnose_portfolio(fx):
+    eng = fx.engine()
+    return (lambda: eng.diagnose_portfolio(fx.portfolio, 10000000)), 1
+
+def case_scan_market(fx):
+    eng = fx.engine()
+    return (lambda: personalize(eng, scan_market(eng, fx.listing), 10000000, 5.0)), 1
+
+CASES = {
+    'metrics_warmup': case_metrics_warmup, 'metrics_warmup_single': case_metrics_warmup_single,
+    'run_diagnosis': case_run_diagnosis, 'run_diagnosis_batch': case_run_diagnosis_batch,
+    'generate_report': case_generate_report, 'diagnose_portfolio': case_diagnose_portfolio,
+    'scan_market': case_scan_market,
+}
+
+# tracemalloc이 봉 단위 루프를 10배쯤 느리게 해서 워밍업은 시간만 측정
+UNTRACED = {'metrics_warmup', 'metrics_warmup_single'}
+
+# cold 1회 + warm repeat회(중앙값), 메모리는 새 엔진으로 cold 1회 추적 (타이밍과 분리)
+def measure(name, fx, n, repeat):
+    fn, calls = CASES[name](fx)
+    t0 = time.perf_counter(); fn(); cold = time.perf_counter() - t0
+    warm = []
+    for _ in range(repeat):
+        t0 = time.perf_counter(); fn(); warm.append(time.perf_counter() - t0)
+    warm = float(np.median(warm))
+    peak = None
+    if name not in UNTRACED:
+        fn, _ = CASES[name](fx)
+        tracemalloc.start(); fn(); peak = tracemalloc.get_traced_memory()[1] / 2**20; tracemalloc.stop()
+    return {
+        'case': name, 'n': n, 'calls': calls, 'cold_ms': cold * 1e3, 'warm_ms': warm * 1e3,
+        'per_call_us': warm / calls * 1e6, 'calls_per_s': calls / warm if warm else float('inf'),
+        'peak_mb': peak,
+    }
+
+# 기준 대비 warm 지연/최대 메모리가 tolerance 넘게 늘어난 항목
+def compare(rows, baseline, tolerance):
+    base = {(r['case'], r['n']): r for r in baseline}
+    bad = []
+    for r in rows:
+        b = base.get((r['case'], r['n']))
+        if b is None: continue
+        for k in ('warm_ms', 'peak_mb'):
+            if r[k] is None or b[k] is None: continue
+            if r[k] > b[k] * (1 + tolerance): bad.append(f"{r['case']}[n={r['n']}] {k}: {b[k]:.2f} → {r[k]:.2f}")
+    return bad
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="엔진/스캔 경로 벤치마크 (합성 데이터)")
+    ap.add_argument('--sizes', default=",".join(map(str, SIZES)), help="유니버스 크기 (쉼표 구분)")
+    ap.add_argument('--cases', default=",".join(CASES), help="실행할 케이스 (쉼표 구분)")
+    ap.add_argument('--repeat', type=int, default=5)
+    ap.add_argument('--json', help="결과 저장 경로")
+    ap.add_argument('--compare', help="기준 결과 JSON")
+    ap.add_argument('--tolerance', type=float, default=0.25, help="허용 악화 비율 (기본 25%%)")
+    args = ap.parse_args(argv)
+
+    rows = []
+    for n in map(int, args.sizes.split(',')):
+        fx = Fixture(n)
+        for name in args.cases.split(','):
+            rows.append(measure(name, fx, n, args.repeat))
+            r = rows[-1]
+            peak = f"{r['peak_mb']:7.1f}MB" if r['peak_mb'] is not None else "      -"
+            print(f"{name:>20} n={n:<5} cold {r['cold_ms']:9.1f}ms  warm {r['warm_ms']:9.2f}ms  "
+                  f"{r['per_call_us']:9.1f}us/call  {r['calls_per_s']:10.0f}/s  peak {peak}", flush=True)
+
+    if args.json:
+        with open(args.json, 'w') as f: json.dump(rows, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f: bad = compare(rows, json.load(f), args.tolerance)
+        for line in bad: print("REGRESSION", line)
+        if bad: sys.exit(1)
+    return rows
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,655 @@
+import pandas as pd
+import numpy as np
+import copy
+import time
+import zlib
+import random
+import heapq
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from timing import timed
+
+# -----------------------------------------------------------------------------
+# SINGULARITY OMEGA ENGINE - 지표/채점/리포트 (Streamlit 의존 없음)
+# app.py(UI)와 backtest.py(과거 재현)가 같은 규칙을 공유
+# -----------------------------------------------------------------------------
+class TTLCache:
+    # 스레드 안전 LRU + TTL (세션 간 공유용)
+    def __init__(self, maxsize=4096, ttl=3600):
+        self.maxsize = maxsize; self.ttl = ttl
+        self._d = OrderedDict(); self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            hit = self._d.get(key)
+            if hit is None: return default
+            if self.ttl and time.time() - hit[0] > self.ttl:
+                del self._d[key]; return default
+            self._d.move_to_end(key)
+            return hit[1]
+
+    def set(self, key, val):
+        with self._lock:
+            self._d[key] = (time.time(), val); self._d.move_to_end(key)
+            while len(self._d) > self.maxsize: self._d.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock: self._d.pop(key, None)
+
+    def __len__(self): return len(self._d)
+
+# 캐시에 None을 값으로 넣는 곳에서 '없음'과 구분하는 표식
+_MISSING = object()
+
+# 지표 버킷 (같은 버킷 안에서는 같은 종목 = 같은 지표)
+BUCKET_SEC = 300
+def data_bucket(now=None):
+    return int((time.time() if now is None else now) // BUCKET_SEC)
+
+# [실측] OHLCV 롤링 지표 - N개 종목 상태를 벡터로 보관, update() 1회 = 전 종목 1봉
+# 창(window) 크기가 고정이라 이력 길이와 무관하게 봉당 비용 일정
+class RollingMetrics:
+    KEYS = ['hurst', 'hawkes', 'vpin', 'es', 'vol_surf', 'kelly']
+
+    def __init__(self, n, window=64, lam=0.94, vol_lam=0.9, decay=0.7, es_alpha=0.05, es_horizon=21):
+        self.n, self.w = n, window
+        self.lam, self.vol_lam, self.decay = lam, vol_lam, decay
+        self.es_k = max(1, int(window * es_alpha)); self.es_scale = np.sqrt(es_horizon)
+        self.pos = 0; self.obs = np.zeros(n, dtype=np.int32)
+        self.prev = np.full(n, np.nan); self.mu = np.zeros(n); self.var = np.zeros(n)
+        self.vol_avg = np.full(n, np.nan); self.excite = np.zeros(n)
+        self.rets = np.zeros((window, n)); self.imb = np.zeros((window, n)); self.vols = np.zeros((window, n))
+        self.imb_sum = np.zeros(n); self.vol_sum = np.zeros(n)
+
+    def update(self, close, volume):
+        close = np.asarray(close, dtype=float); volume = np.nan_to_num(np.asarray(volume, dtype=float))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = np.log(close / self.prev)
+        ok = np.isfinite(r); r = np.where(ok, r, 0.0)
+        sigma = np.sqrt(self.var)
+
+        # VPIN: BVC로 매수/매도 거래량 분리 (봉 1개 = 버킷 1개), 창 합계는 누적합으로 O(1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = np.clip(np.where(sigma > 0, r / sigma, 0.0), -20.0, 20.0)
+        buy = 1.0 / (1.0 + np.exp(-1.702 * z))
+        imb = np.abs(2.0 * buy - 1.0) * volume
+        p = self.pos
+        self.imb_sum += imb - self.imb[p]; self.vol_sum += volume - self.vols[p]
+        self.imb[p] = imb; self.vols[p] = volume; self.rets[p] = r
+        self.pos = (p + 1) % self.w
+
+        # Hawkes: 거래량 서프라이즈가 자기 흥분, 지수 감쇠
+        va = np.where(np.isfinite(self.vol_avg), self.vol_avg, volume)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            surprise = np.where(va > 0, np.maximum(volume / va - 1.0, 0.0), 0.0)
+        self.excite = self.decay * self.excite + surprise
+        self.vol_avg = self.vol_lam * va + (1 - self.vol_lam) * volume
+
+        # EWMA 평균/분산 (RiskMetrics λ)
+        self.mu = np.where(ok, self.lam * self.mu + (1 - self.lam) * r, self.mu)
+        self.var = np.where(ok, self.lam * self.var + (1 - self.lam) * r * r, self.var)
+        self.obs += ok
+        self.prev = np.where(np.isfinite(close), close, self.prev)
+
+    def feed(self, closes, volumes):
+        for c, v in zip(closes, volumes): self.update(c, v)
+
+    # 종목 j 하나짜리 상태로 분리 (여러 종목을 한 번에 워밍업한 뒤 종목별 보관용)
+    def column(self, j):
+        out = copy.copy(self); out.n = 1
+        for k, v in vars(self).items():
+            if isinstance(v, np.ndarray): setattr(out, k, v[..., j:j + 1].copy())
+        return out
+
+    @property
+    def ready(self):
+        return self.obs >= self.w
+
+    def snapshot(self):
+        x = np.roll(self.rets, -self.pos, axis=0)
+        # R/S Hurst (창 1개 추정)
+        dev = np.cumsum(x - x.mean(axis=0), axis=0)
+        rs_r = dev.max(axis=0) - dev.min(axis=0); rs_s = x.std(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            hurst = np.where((rs_s > 0) & (rs_r > 0), np.log(rs_r / rs_s) / np.log(self.w), 0.5)
+            vpin = np.where(self.vol_sum > 0, self.imb_sum / self.vol_sum, 0.0)
+            kelly = np.where(self.var > 0, self.mu / self.var, 0.0)
+        # 과거 ES(하위 5% 평균) → √t 로 한 달 보유 기준 환산
+        tail = np.partition(x, self.es_k - 1, axis=0)[:self.es_k]
+        es = np.maximum(np.expm1(tail).mean(axis=0) * self.es_scale, -1.0)
+        out = {
+            'hurst': np.clip(hurst, 0.0, 1.0), 'hawkes': 1.0 + self.excite, 'vpin': vpin, 'es': es,
+            'vol_surf': np.clip(np.sqrt(self.var) / 0.05, 0.1, 0.9), 'kelly': np.clip(kelly, 0.01, 0.30),
+        }
+        return {k: np.where(self.ready, v, np.nan) for k, v in out.items()}
+
+# 종목별 롤링 상태 보관 - 새로 확정된 봉만 반영, 스냅샷은 (종목, 마지막 봉) 단위로 재사용
+# 저장소가 mtime(code)를 주면 파일과 날짜가 그대로인 동안은 다시 읽지 않음, 잠금은 종목별
+class MetricsBook:
+    WARMUP = 250
+
+    def __init__(self, store):
+        self.store = store; self._state = {}
+        self._locks = {}; self._lock = threading.Lock()
+
+    def _key_lock(self, code):
+        with self._lock: return self._locks.setdefault(code, threading.Lock())
+
+    # 날이 바뀌면 어제 장중 봉이 확정 봉이 되므로 날짜도 같이 비교
+    def _stamp(self, code):
+        mtime = getattr(self.store, 'mtime', None)
+        t = mtime(code) if mtime else None
+        return None if t is None else (t, datetime.now().date())
+
+    def _confirmed(self, code):
+        df = self.store.history(code, fetch=False)
+        if df is None or df.empty: return None
+        return df.iloc[:df.index.searchsorted(pd.Timestamp(datetime.now().date()))]  # 장중 봉은 제외 (확정 봉만)
+
+    @staticmethod
+    def _snap(rm, j=0, snap=None):
+        if not rm.ready[j]: return None
+        return {k: float(v[j]) for k, v in (snap or rm.snapshot()).items()}
+
+    @timed('metrics.book')
+    def get(self, code):
+        with self._key_lock(code):
+            stamp = self._stamp(code)
+            stamp0, last, rm, snap = self._state.get(code, (None, None, None, None))
+            if rm is not None and stamp is not None and stamp == stamp0: return snap
+            df = self._confirmed(code)
+            if df is None: return snap
+            if rm is None: rm = RollingMetrics(1); new = df.tail(self.WARMUP)
+            else: new = df.iloc[df.index.searchsorted(last, side='right'):]
+            if len(new):
+                rm.feed(new['Close'].to_numpy()[:, None], new['Volume'].to_numpy()[:, None])
+                last = new.index[-1]; snap = self._snap(rm)
+            if last is not None: self._state[code] = (stamp, last, rm, snap)
+            return snap
+
+    # [배치] 상태 없는 종목은 이력 길이별로 묶어 N폭 RollingMetrics 1개로 워밍업한 뒤 종목별로 나눔
+    # (길이가 같은 종목끼리만 묶어야 단건 get()과 같은 상태가 됨 - 합산 순서 차이로 인한 반올림 오차만 다름)
+    @timed('metrics.book_many')
+    def get_many(self, codes):
+        codes = list(dict.fromkeys(codes))
+        cold = {}
+        for c in codes:
+            if c in self._state: continue
+            stamp = self._stamp(c); df = self._confirmed(c)
+            if df is not None and len(df): cold[c] = (stamp, df.tail(self.WARMUP))
+        groups = {}
+        for c, (_, df) in cold.items(): groups.setdefault(len(df), []).append(c)
+        out = {}
+        for cs in groups.values():
+            rm = RollingMetrics(len(cs))
+            rm.feed(np.column_stack([cold[c][1]['Close'].to_numpy() for c in cs]),
+                    np.column_stack([cold[c][1]['Volume'].to_numpy() for c in cs]))
+            snap = rm.snapshot()
+            for j, c in enumerate(cs):
+                with self._key_lock(c):
+                    if c in self._state: continue  # 그 사이 단건 get()이 먼저 채움
+                    out[c] = self._snap(rm, j, snap)
+                    self._state[c] = (cold[c][0], cold[c][1].index[-1], rm.column(j), out[c])
+        for c in codes:
+            if c not in out: out[c] = self.get(c)
+        return out
+
+class MetricsProvider:
+    # 11대 지표 분포 (lo, hi) - betti는 붕괴 확률
+    METRIC_SPECS = {
+        "omega": (5.0, 30.0), "vol_surf": (0.1, 0.9), "hurst": (0.2, 0.99),
+        "te": (0.1, 5.0), "vpin": (0.0, 1.0), "hawkes": (0.1, 4.0), "obi": (-1.0, 1.0),
+        "gnn": (0.1, 1.0), "es": (-0.30, -0.01), "kelly": (0.01, 0.30)
+    }
+    BETTI_P = 0.15
+    KEYS = list(METRIC_SPECS) + ['betti']
+
+    def __init__(self, book=None, resolve=None, maxsize=20000, ttl=BUCKET_SEC * 2):
+        self.book = book; self.resolve = resolve
+        self.cache = TTLCache(maxsize, ttl)
+        self._real_idx = [self.KEYS.index(k) for k in RollingMetrics.KEYS]
+        self._lo = np.array([lo for lo, _ in self.METRIC_SPECS.values()])
+        self._hi = np.array([hi for _, hi in self.METRIC_SPECS.values()])
+
+    # (종목, 모드, 버킷) 시드 → splitmix64 카운터로 열마다 [0, 1) 난수 - 전역 np.random 없이 배열 한 번에 생성
+    @staticmethod
+    def _uniform(seeds, k):
+        with np.errstate(over='ignore'):
+            x = seeds[:, None] + np.arange(1, k + 1, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+            x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+            x ^= x >> np.uint64(31)
+        return (x >> np.uint64(11)) * 2.0 ** -53
+
+    # 이력이 있는 종목의 OHLCV 실측값 (종목 수, 6) - 모드와 무관하므로 (종목, 버킷)당 1번, 없으면 NaN 행
+    def _real(self, names, bucket):
+        out = np.full((len(names), len(RollingMetrics.KEYS)), np.nan)
+        if not (self.book and self.resolve): return out
+        cold = {}
+        for j, name in enumerate(names):
+            hit = self.cache.get((name, bucket))
+            if hit is not None: out[j] = hit
+            else: cold.setdefault(name, []).append(j)
+        if cold:
+            codes = {name: self.resolve(name) for name in cold}
+            got = self.book.get_many([c for c in codes.values() if c])
+            for name, js in cold.items():
+                real = got.get(codes[name]) if codes[name] else None
+                row = np.array([real[k] for k in RollingMetrics.KEYS]) if real else np.full(len(RollingMetrics.KEYS), np.nan)
+                self.cache.set((name, bucket), row); out[js] = row
+        return out
+
+    # 일봉이 새로 받아진 종목은 이번 버킷의 실측값을 다시 읽도록 (이력 없던 NaN 행이 버킷 끝까지 남지 않게)
+    def forget(self, names, bucket=None):
+        bucket = data_bucket() if bucket is None else bucket
+        for name in names: self.cache.pop((name, bucket))
+
+    # (모드 수, 종목 수, 지표 수) - 랜덤 분포 위에 실측값을 덮어씀
+    def _draw(self, names, modes, bucket):
+        seeds = np.array([(zlib.crc32(f"{name}|{mode}".encode()) << 32) | (bucket & 0xFFFFFFFF) for mode in modes for name in names], dtype=np.uint64)
+        u = self._uniform(seeds, len(self.KEYS)).reshape(len(modes), len(names), len(self.KEYS))
+        rows = np.empty_like(u)
+        rows[..., :-1] = self._lo + u[..., :-1] * (self._hi - self._lo)
+        rows[..., -1] = u[..., -1] < self.BETTI_P
+        real = self._real(names, bucket)
+        rows[..., self._real_idx] = np.where(np.isnan(real), rows[..., self._real_idx], real)
+        return rows
+
+    def get(self, name, mode="swing", bucket=None):
+        row = self._draw([name], (mode,), data_bucket() if bucket is None else bucket)[0, 0]
+        m = dict(zip(self.KEYS, row.tolist()))
+        m['betti'] = int(m['betti'])
+        return m
+
+    # [배치] (모드 수, 종목 수) 컬럼 - 단건 get()과 같은 값
+    @timed('metrics.batch')
+    def get_batch(self, names, modes=("swing",), bucket=None):
+        rows = self._draw(list(names), modes, data_bucket() if bucket is None else bucket)
+        cols = {k: rows[..., c] for c, k in enumerate(self.KEYS)}
+        cols['betti'] = cols['betti'].astype(np.int8)
+        return cols
+
+# [계좌] 보유 종목 수익률 행렬 1개로 베타/상관/공분산을 한 번에 계산
+# 비싼 부분(이력 정렬 + 공분산)은 종목 집합 단위 캐시, 수량/가격 변경은 가중치만 다시 계산
+class PortfolioAnalytics:
+    INDEXES = ('KS11', 'KQ11')
+
+    def __init__(self, store, resolve=None, window=120, min_obs=20):
+        self.store = store; self.resolve = resolve; self.window = window; self.min_obs = min_obs
+        self.cache = TTLCache(maxsize=512, ttl=3600); self.misses = TTLCache(maxsize=512, ttl=60)
+
+    def asset_stats(self, codes):
+        codes = tuple(sorted(set(codes)))
+        key = (codes, datetime.now().date())
+        stats = self.cache.get(key, _MISSING)
+        if stats is _MISSING: stats = self.misses.get(key, _MISSING)
+        if stats is _MISSING:
+            stats = self._compute(codes)
+            # 이력 부족(None)은 짧게만 기억 - 진단마다 다시 읽지 않되, 보유 종목 일봉이 받아지면 곧 다시 계산
+            (self.cache if stats is not None else self.misses).set(key, stats)
+        return stats
+
+    @timed('portfolio.stats')
+    def _compute(self, codes):
+        series = {}
+        for c in codes + self.INDEXES:
+            df = self.store.history(c, fetch=False)
+            if df is None or df.empty: return None
+            series[c] = df['Close']
+        closes = pd.concat(series, axis=1).tail(self.window + 1)
+        rets = np.log(closes.to_numpy(dtype=float)); rets = np.diff(rets, axis=0)
+        rets = rets[np.isfinite(rets).all(axis=1)]
+        if len(rets) < self.min_obs: return None
+        n = len(codes)
+        cov = np.cov(rets, rowvar=False)
+        sd = np.sqrt(np.diag(cov))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = cov / np.outer(sd, sd)
+        return {
+            'codes': codes, 'cov': cov[:n, :n], 'corr': corr[:n, :n],
+            'beta_kospi': cov[:n, n] / cov[n, n], 'beta_kosdaq': cov[:n, n + 1] / cov[n + 1, n + 1],
+            'mkt_ret': rets[:, n].mean() * 252,
+        }
+
+    # holdings: [(종목명, 평가금액)] → 계좌 지표 (이력 없으면 집중도/현금 비중만)
+    def analyze(self, holdings, cash):
+        names = [n for n, _ in holdings]
+        values = np.array([v for _, v in holdings], dtype=float)
+        total = cash + values.sum()
+        w_all = values / total if total else np.zeros_like(values)
+        w_stk = values / values.sum() if values.sum() else np.zeros_like(values)
+        out = {'cash_r': float(cash / total * 100) if total else 100.0, 'hhi': float((w_stk ** 2).sum()), 'n': len(set(names)),
+               'beta': np.nan, 'beta_kosdaq': np.nan, 'avg_corr': np.nan, 'vol': np.nan, 'cash_drag': np.nan}
+        codes = [self.resolve(n) if self.resolve else None for n in names]
+        if not holdings or None in codes: return out
+        stats = self.asset_stats(codes)
+        if stats is None: return out
+
+        # 같은 종목 여러 줄이면 합산, 캐시된 종목 순서로 가중치 정렬
+        idx = {c: i for i, c in enumerate(stats['codes'])}
+        w = np.zeros(len(idx)); ws = np.zeros(len(idx))
+        np.add.at(w, [idx[c] for c in codes], w_all); np.add.at(ws, [idx[c] for c in codes], w_stk)
+        off = 1.0 - (ws ** 2).sum()
+        out.update({
+            'beta': float(w @ stats['beta_kospi']), 'beta_kosdaq': float(w @ stats['beta_kosdaq']),
+            'vol': float(np.sqrt(max(w @ stats['cov'] @ w, 0.0) * 252)),
+            'avg_corr': float((ws @ np.nan_to_num(stats['corr']) @ ws - (ws ** 2).sum()) / off) if off > 1e-9 else np.nan,
+            'cash_drag': float(cash / total * stats['mkt_ret'] * 100) if total else 0.0,
+        })
+        return out
+
+# 지표 1행 = float32 11개 (m['omega'] 식 접근은 dict와 같음, 세션 보관/피클 크기는 1/4 수준)
+class Metrics:
+    __slots__ = ('v',)
+    KEYS = MetricsProvider.KEYS
+    _IDX = {k: i for i, k in enumerate(KEYS)}
+
+    def __init__(self, values):
+        self.v = np.frombuffer(values, dtype=np.float32) if isinstance(values, bytes) else np.asarray(values, dtype=np.float32)
+
+    @classmethod
+    def from_dict(cls, m):
+        return cls([m[k] for k in cls.KEYS])
+
+    def __getitem__(self, key): return float(self.v[self._IDX[key]])
+    def __reduce__(self): return (Metrics, (self.v.tobytes(),))
+
+# 리포트: 수치 계획(가격/목표/손절/수익률)만 보관 - 문구는 rationale/engine.narrative()가 지연 생성
+class Report:
+    __slots__ = ('name', 'mode', 'bucket', 'wr', 'm', 'can_buy', 'prices', 'target_return', 'expected_yield')
+
+    def __init__(self, **fields):
+        for k, v in fields.items(): setattr(self, k, v)
+
+    def __getitem__(self, key): return getattr(self, key)
+
+    @property
+    def rationale(self):
+        if self.mode == "scalping":
+            return f"내재 변동성(Vol) {self.m['vol_surf']:.2f} 기반 1.5σ 상단 목표가, 0.5σ 하단 손절가 산출."
+        return f"사용자 목표 수익률 {self.target_return}% 및 Hurst Exponent {self.m['hurst']:.2f}의 추세 지속성 반영."
+
+# 카드 1장 결과 - tags는 RULES 순번 비트 (engine.tags()로 라벨 복원)
+class Pick:
+    __slots__ = ('name', 'price', 'win', 'm', 'tags', 'mode', 'plan', 'pnl', 'is_holding')
+
+    def __init__(self, name, price, win, m, tags, mode, plan=None, pnl=0.0, is_holding=False):
+        self.name = name; self.price = price; self.win = win; self.m = m; self.tags = tags
+        self.mode = mode; self.plan = plan; self.pnl = pnl; self.is_holding = is_holding
+
+# 채점 임계값 - 백테스트 스윕에서 일부만 덮어씀
+RULE_PARAMS = {
+    'omega_lo': 20.0, 'omega_hi': 28.0, 'hawkes': 2.2, 'gnn': 0.85, 'hurst': 0.65,
+    'vpin': 0.65, 'es': -0.20,
+}
+
+# 채점 규칙 (지표, 조건, 점수, 태그, 색) - 단건/배치/백테스트 공용
+def make_rules(**params):
+    p = {**RULE_PARAMS, **params}
+    return [
+        # Physics & Math (JLS, Hawkes)
+        ('omega', lambda x: (x >= p['omega_lo']) & (x <= p['omega_hi']), 25, 'JLS 임계점', '#00ff00'),
+        ('hawkes', lambda x: x > p['hawkes'], 25, 'Hawkes 폭발', '#00ff00'),
+        # Network & Fractal (GNN, Hurst)
+        ('gnn', lambda x: x > p['gnn'], 20, 'GNN 대장주', '#FFD700'),
+        ('hurst', lambda x: x > p['hurst'], 15, '추세 지속', '#00ccff'),
+        # Risk (Penalty)
+        ('vpin', lambda x: x > p['vpin'], -40, '⚠️ 독성 매물', '#ff4444'),
+        ('es', lambda x: x < p['es'], -25, '📉 Tail Risk', '#ff4444'),
+        ('betti', lambda x: x == 1, -25, '🌀 구조 붕괴', '#ff4444'),
+    ]
+
+# 목표가/손절가 (스칼라, 배열 모두 가능)
+def plan_levels(mode, price, vol_surf, target_return):
+    if mode == "scalping":
+        vol = vol_surf * 0.05
+        return price * (1 + np.maximum(vol, 0.03)), price * (1 - vol * 0.5)
+    return price * (1 + target_return / 100), price * 0.93
+
+class SingularityEngine:
+    def __init__(self, provider=None, analytics=None, rules=None):
+        self.provider = provider if provider is not None else MetricsProvider()
+        self.analytics = analytics if analytics is not None else PortfolioAnalytics(None)
+        self.texts = TTLCache(maxsize=2000, ttl=BUCKET_SEC * 2)
+        if rules is not None: self.RULES = rules
+
+    RULES = make_rules()
+
+    def _score(self, m):
+        score = 0.0
+        for key, cond, pts, _, _ in self.RULES:
+            score = score + np.where(cond(m[key]), pts, 0)
+        return np.clip(score, 0.0, 100.0) / 100.0
+
+    @timed('engine.score')
+    def run_diagnosis(self, name, mode="swing"):
+        m = self.provider.get(name, mode)
+        return float(self._score(m)), Metrics.from_dict(m), self.tag_bits(m)
+
+    # 발동한 규칙 → 비트 플래그 (라벨 dict 목록 대신 int 1개)
+    def tag_bits(self, m):
+        return sum(1 << i for i, (key, cond, *_) in enumerate(self.RULES) if cond(m[key]))
+
+    def tags(self, bits):
+        return [(label, bg) for i, (_, _, _, label, bg) in enumerate(self.RULES) if bits >> i & 1]
+
+    # [배치] 전 종목 x 모드 점수 행렬 (루프 없이 마스크 연산)
+    # scores: (len(modes), len(names)), metrics: 지표별 동일 shape 배열
+    @timed('engine.score_batch')
+    def run_diagnosis_batch(self, names, modes=("scalping", "swing"), bucket=None):
+        m = self.provider.get_batch(names, modes, bucket)
+        return self._score(m), m
+
+    # 배치 결과에서 (모드 i, 종목 j) 한 칸을 단건 결과 형식으로 복원
+    def pick(self, scores, metrics, i, j):
+        m = {k: v[i, j].item() for k, v in metrics.items()}
+        return float(scores[i, j]), Metrics.from_dict(m), self.tag_bits(m)
+
+    # 🐹 햄찌: 메스가끼 + 쉬운 설명 + 구체적 분단위 지시
+    def _get_hamzzi_msg(self, wr, m, can_buy, target, price, rnd=random):
+        t_m1 = rnd.randint(1, 9); t_m2 = rnd.randint(10, 25); t_m3 = rnd.randint(30, 50)
+        
+        logic_variations = [
+            f"**JLS Omega**가 {m['omega']:.1f}Hz로 부르르 떨고 있어! (폭발 직전 진동수라는 뜻이야)",
+            f"**Hawkes 강도**가 {m['hawkes']:.2f}를 뚫었어! (기계들이 미친 듯이 매수 버튼 누른다는 뜻)",
+            f"**GNN 중심성** {m['gnn']:.2f} 실화냐? (시장 돈이 다 여기로 빨려 들어간다는 뜻)"
+        ]
+        
+        if wr >= 0.70:
+            return f"""
+            **[🐹 햄찌의 야수 본능: "쫄보야? 눈 떠!"]**
+            "야, 너 진짜 이거 안 살 거야? **[Singularity Omega]** 엔진이 비명을 지르잖아!
+            {rnd.choice(logic_variations)}
+            이건 단순 반등이 아니라 **'패러다임의 변화'**야. 지금 안 사면 평생 후회할걸?"
+            <div class='timetable-box'><b>⏰ 햄찌의 초단위 타임테이블</b><br>
+            1. <b>09:0{t_m1}</b>: 동시호가 갭상승 2% 이내면 <b>시장가 풀매수</b> ({can_buy}주)!<br>
+            2. <b>09:{t_m2}</b>: 눌림목(VWAP 지지)에서 <b>신용 미수</b> 불타기!<br>
+            3. <b>14:{t_m3}</b>: 상한가 문 닫으면 오버나잇, 아니면 <b>{target:,}원</b>에서 절반 챙겨.</div>
+            **👉 한줄 요약: 인생 역전 티켓이야! 쫄지 말고 질러!**
+            """
+        elif wr >= 0.50:
+            return f"""
+            **[🐹 햄찌의 단타 훈수: "짧게 먹고 튀어!"]**
+            "흥, 애매하네. **Hurst** {m['hurst']:.2f}라 추세는 있는데(한 번 가면 계속 가는 성질), **OBI**가 별로야(눈치 싸움 중).
+            세력들이 간 보고 있다는 증거지. 길게 가져가면 물린다?"
+            <div class='timetable-box'><b>⏰ 햄찌의 타임테이블</b><br>
+            1. <b>09:00</b>: 절대 진입 금지. 구경만 해.<br>
+            2. <b>10:{t_m2}</b>: <b>{price:,}원</b> 지지 시 <b>{int(can_buy/3)}주</b> 정찰병 투입.<br>
+            3. <b>13:{t_m3}</b>: 슈팅 나오면 뒤도 돌아보지 말고 전량 매도!</div>
+            **👉 한줄 요약: 욕심 부리지 마! 짧게 먹고 튀는 거야.**
+            """
+        else:
+            return f"""
+            **[🐹 햄찌의 경멸: "너 바보야?"]**
+            "야! **VPIN** {m['vpin']:.2f} 안 보여? (세력들이 물량 떠넘기는 설거지 수치라구!)
+            **Tail Risk**가 **{m['es']:.2f}**야. 내 돈 아니라고 막 쓰지 마!"
+            <div class='timetable-box'><b>⏰ 햄찌의 행동 지침</b><br>
+            1. <b>지금 당장</b>: <b>시장가 투매!</b> 탈출은 지능순이야.<br>
+            2. <b>장중 내내</b>: HTS 꺼. 쳐다보는 순간 뇌동매매한다.</div>
+            **👉 한줄 요약: 폭탄이야! 만지면 손목 날아가! 도망쳐!**
+            """
+
+    # 🐯 호찌: 꼰대 + 사자성어(뜻) + 학술적 설명
+    def _get_hojji_msg(self, wr, m, can_buy, target, price, rnd=random):
+        idiom_good = rnd.choice(["**금상첨화(錦上添花, 좋은 일 겹침)**", "**낭중지추(囊中之錐, 재능이 드러남)**"])
+        idiom_bad = rnd.choice(["**사상누각(砂上樓閣, 기초 부실)**", "**내우외환(內憂外患, 안팎으로 근심)**"])
+        
+        logic_good = f"**전이 엔트로피(TE)** 흐름이 양의 방향이야. (실적과 수급이 주가를 밀어 올리는 '실체 있는 상승'이란 말일세.)"
+        logic_bad = f"**비에르고딕(Non-Ergodic)** 파산 위험이 감지되었네. (여기서 물리면 자네 자산은 영원히 복구 불가능해.)"
+
+        if wr >= 0.70:
+            return f"""
+            **[🐯 호찌의 훈장님 말씀: "진국일세!"]**
+            "허허, {idiom_good}로세! {logic_good}
+            **JLS 모델**상으로도 버블 붕괴 위험은 낮으니 안심하게."
+            <div class='timetable-box'><b>⏳ 호찌의 행동 지침</b><br>
+            1. <b>진입 (14:15)</b>: 변동성이 줄어드는 오후, <b>{int(can_buy*0.8)}주</b> 분할 매수.<br>
+            2. <b>운용</b>: <b>{target:,}원</b>까지는 <b>'우보천리'</b>의 마음으로 홀딩.</div>
+            **👉 한줄 요약: 근본 있는 종목이야. 엉덩이 무겁게 들고 가시게.**
+            """
+        elif wr >= 0.50:
+            return f"""
+            **[🐯 호찌의 신중론: "돌다리도 두들겨 보게"]**
+            "음... 계륵일세. **국소 변동성** 표면이 거칠어. (투기적 자금이 들어와서 주가가 널뛸 수 있네.)
+            **'거안사위(편안할 때 위태로움을 생각함)'**의 자세가 필요하네."
+            <div class='timetable-box'><b>⏳ 호찌의 행동 지침</b><br>
+            1. <b>진입</b>: 오늘은 관망. 내일 시초가 확인 후 결정.<br>
+            2. <b>운용</b>: 정 사고 싶다면 <b>{int(can_buy*0.2)}주</b>만 소액으로.</div>
+            **👉 한줄 요약: 위험해 보이네. 리스크 관리가 최우선이야.**
+            """
+        else:
+            return f"""
+            **[🐯 호찌의 대호통: "썩은 동아줄이야!"]**
+            "어허! {idiom_bad}일세! {logic_bad}
+            **Going Concern(계속기업가치)**에 의문이 들어."
+            <div class='timetable-box'><b>⏳ 호찌의 행동 지침</b><br>
+            1. <b>즉시</b>: 포트폴리오에서 제외하게.<br>
+            2. <b>향후</b>: 펀더멘털 개선 전까진 쳐다도 보지 마.</div>
+            **👉 한줄 요약: 절대 잡지 마라. 잡으면 떨어진다네.**
+            """
+
+    @timed('engine.report')
+    def generate_report(self, mode, price, m, wr, cash, current_qty, target_return, name=None):
+        # Top 3는 절대 평가이므로 단타/스윙 모드는 내부적으로만 계산하여 최적값 도출
+        target, stop = (int(x) for x in plan_levels(mode, price, m['vol_surf'], target_return))
+        expected_yield = (target - price) / price * 100 if mode == "scalping" else target_return
+        can_buy = int((cash * m['kelly'] * 0.5) / price) if price > 0 else 0
+        return Report(name=name, mode=mode, bucket=data_bucket(), wr=wr, m=m, can_buy=can_buy,
+                      prices=(price, target, stop), target_return=target_return, expected_yield=expected_yield)
+
+    # 페르소나 문구는 카드 탭이 열릴 때만 생성, 문구에 들어가는 값(승률/지표/매수 수량/가격) 전부를 키로 메모
+    @timed('engine.narrative')
+    def narrative(self, plan, persona):
+        price, target, _ = plan.prices
+        m = plan.m.v.tobytes() if isinstance(plan.m, Metrics) else tuple(plan.m[k] for k in Metrics.KEYS)
+        key = (plan.name, plan.mode, plan.bucket, persona, plan.wr, m, plan.can_buy, target, price)
+        txt = self.texts.get(key)
+        if txt is None:
+            rnd = random.Random(f"{plan.name}|{plan.mode}|{plan.bucket}|{persona}")
+            msg = self._get_hamzzi_msg if persona == 'hamzzi' else self._get_hojji_msg
+            txt = msg(plan.wr, plan.m, plan.can_buy, target, price, rnd)
+            self.texts.set(key, txt)
+        return txt
+
+    # prices: 종목명 → 현재가 (없으면 평단가로 평가)
+    @timed('engine.portfolio')
+    def diagnose_portfolio(self, portfolio, cash, prices=None):
+        if not portfolio: return "포트폴리오 없음", "데이터 없음"
+        prices = prices or {}
+        holdings = [(s['name'], prices.get(s['name'], s['price']) * s['qty']) for s in portfolio if s['name']]
+        a = self.analytics.analyze(holdings, cash)
+        fmt = lambda x, f=".2f": format(x, f) if np.isfinite(x) else "N/A"
+
+        beta_line = (f"지금 **Beta**가 **{fmt(a['beta'])}**밖에 안 돼. 내일 **레버리지** 태워서 시장 이겨야지! 쫄보야?"
+                     if not np.isfinite(a['beta']) or a['beta'] < 1.0 else
+                     f"**Beta {fmt(a['beta'])}**! 시장보다 더 출렁인다구. 연 변동성 **{fmt(a['vol'] * 100, '.1f')}%**, 심장 튼튼하지?")
+        drag_line = f"연 **{a['cash_drag']:.1f}%p**가 썩고 있어!" if np.isfinite(a['cash_drag']) and a['cash_drag'] > 0 else "돈이 썩고 있어!"
+        h = f"""
+        **[🐹 햄찌의 계좌 팩트 폭격]**
+        "사장님! **예수금 {a['cash_r']:.1f}%**? **[Cash Drag]**야! {drag_line}
+        {beta_line}"
+        """
+        corr_line = (f"종목 간 평균 상관계수가 **{fmt(a['avg_corr'])}**로 높아서 하락장 오면 '공멸'이야."
+                     if np.isfinite(a['avg_corr']) and a['avg_corr'] >= 0.5 else
+                     f"종목 간 평균 상관계수 **{fmt(a['avg_corr'])}**, 집중도 **HHI {a['hhi']:.2f}** (1에 가까울수록 몰빵)일세.")
+        t = f"""
+        **[🐯 호찌의 자산 배분 훈계]**
+        "자네, **보유 {a['n']}종목**... 너무 안일해. {corr_line}
+        **[국채]**나 **[금]**을 편입해서 **'유비무환'**의 방어벽을 세우게."
+        """
+        return h, t
+
+# [랭킹] 상위 K개 선택 - 전체 정렬 대신 partition, 동점이면 앞 순번(시총 큰 쪽) 우선
+def top_k(scores, k=3):
+    scores = np.asarray(scores); n = len(scores)
+    if n > k:
+        kth = np.partition(scores, n - k)[n - k]
+        cand = np.flatnonzero(scores >= kth)
+    else: cand = np.arange(n)
+    return cand[np.argsort(-scores[cand], kind='stable')[:k]]
+
+# 청크 단위 스트리밍 상위 K - 힙 크기 K 고정이라 메모리 O(K)
+class TopK:
+    def __init__(self, k=3):
+        self.k = k; self.heap = []
+
+    def push(self, score, j, item):
+        entry = (score, -j, item)
+        if len(self.heap) < self.k: heapq.heappush(self.heap, entry)
+        elif entry[:2] > self.heap[0][:2]: heapq.heapreplace(self.heap, entry)
+
+    def result(self):
+        return [e[2] for e in sorted(self.heap, key=lambda e: e[:2], reverse=True)]
+
+# [스캔] 세션 무관 부분 (점수/지표/태그/가격) - 스케줄러 워커에서도 실행
+SCAN_MODES = [("scalping", "초단타"), ("swing", "추세추종")]
+
+# [스캔] 청크 단위 스트리밍 - 청크마다 (처리 수, 전체 수, 보드) 를 내보냄 (첫 값은 처리 0건)
+# warm: 이력 갱신 훅 - 청크마다 그 청크만 호출 (첫 결과까지 전체 대기 없음)
+def scan_stream(engine, market_data, warm=None, chunk=512):
+    if not market_data.empty: market_data = market_data[market_data['Close'].notna()]
+    names = market_data['Name'].tolist() if not market_data.empty else []
+    prices = market_data['Close'].to_numpy(dtype=float).astype(int) if names else np.zeros(0, dtype=int)
+    boards = {'sc_list': TopK(3), 'sw_list': TopK(3), 'ideal_list': TopK(3)}
+    yield 0, len(names), boards
+
+    # Scalping & Swing Analysis (청크별 배치 채점 → 청크마다 상위 K만 남기고 폐기)
+    for lo in range(0, len(names), chunk):
+        part = names[lo:lo + chunk]
+        if warm: warm(part)
+        scores, metrics = engine.run_diagnosis_batch(part, [k for k, _ in SCAN_MODES])
+        # [Top 3 Absolute] Pick better mode for Hall of Fame (동점이면 단타 우선)
+        best_mode = np.where(scores[0] >= scores[1], 0, 1)
+        lanes = (('sc_list', scores[0], np.zeros_like(best_mode)), ('sw_list', scores[1], np.ones_like(best_mode)),
+                 ('ideal_list', scores.max(axis=0), best_mode))
+        for key, sc, mi in lanes:
+            for j in top_k(sc, 3):
+                wr, m, tags = engine.pick(scores, metrics, mi[j], j)
+                boards[key].push(float(sc[j]), lo + j, Pick(names[lo + j], int(prices[lo + j]), wr, m, tags, SCAN_MODES[mi[j]][0]))
+        yield lo + len(part), len(names), boards
+
+# 표시될 후보만 최신가 조회 (목록 종가는 최대 1시간 묵음), quotes: 종목명 집합 → {종목명: 가격}
+def finish_scan(boards, quotes=None):
+    picks = {key: b.result() for key, b in boards.items()}
+    live = quotes({x.name for p in picks.values() for x in p}) if quotes else {}
+    for p in picks.values():
+        for x in p: x.price = int(live.get(x.name, x.price))
+    return picks
+
+@timed('scan.market')
+def scan_market(engine, market_data, warm=None, quotes=None, chunk=512):
+    for _, _, boards in scan_stream(engine, market_data, warm, chunk): pass
+    return finish_scan(boards, quotes)
+
+# [스캔] 세션별 부분 - 예수금/목표 수익률로 리포트(최종 K개만) 생성, 지표는 공용 픽과 공유
+@timed('scan.personalize')
+def personalize(engine, picks, cash, target_return):
+    labels = dict(SCAN_MODES)
+    out = {}
+    for key, p in picks.items():
+        out[key] = []
+        for x in p:
+            plan = engine.generate_report(x.mode, x.price, x.m, x.win, cash, 0, target_return, x.name)
+            out[key].append(Pick(x.name, x.price, x.win, x.m, x.tags, labels[x.mode], plan))
+    return out
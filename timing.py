@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import functools
+import threading
+import numpy as np
+from collections import deque
+
+# -----------------------------------------------------------------------------
+# TIMING SPANS - 단계별 소요 시간 링 버퍼 (꺼져 있으면 속성 1번 확인 후 바로 통과)
+#   with span('scan.market'): ...      @timed('engine.report')
+#   HH_TIMING=1 로 켜고 시작, 앱의 관리자 패널에서 켜고 끌 수도 있음
+# -----------------------------------------------------------------------------
+class _NullSpan:
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+_NULL = _NullSpan()
+
+class _Span:
+    __slots__ = ('rec', 'name', 't0')
+
+    def __init__(self, rec, name):
+        self.rec = rec; self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter(); return self
+
+    def __exit__(self, *exc):
+        self.rec.record(self.name, time.perf_counter() - self.t0)
+        return False
+
+class SpanRecorder:
+    def __init__(self, size=8192, enabled=False):
+        self.enabled = enabled
+        self.buf = deque(maxlen=size); self._lock = threading.Lock()
+        self.totals = {}  # 구간별 누적 [호출 수, 합계] - 링 버퍼가 돌아도 줄지 않음 (Prometheus 카운터용)
+
+    def span(self, name):
+        return _Span(self, name) if self.enabled else _NULL
+
+    def timed(self, name):
+        def deco(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled: return fn(*args, **kwargs)
+                t0 = time.perf_counter()
+                try: return fn(*args, **kwargs)
+                finally: self.record(name, time.perf_counter() - t0)
+            return wrapper
+        return deco
+
+    # 링 버퍼 추가와 누적값 갱신을 같이 잠금 (+= 는 원자적이지 않음)
+    def record(self, name, sec):
+        with self._lock:
+            self.buf.append((time.time(), name, sec))
+            t = self.totals.get(name)
+            if t is None: self.totals[name] = [1, sec]
+            else: t[0] += 1; t[1] += sec
+
+    def snapshot(self):
+        with self._lock: return list(self.buf)
+
+    # 최근 구간 기록만 비움 (누적값은 프로세스 수명 동안 유지)
+    def clear(self):
+        with self._lock: self.buf.clear()
+
+    def cumulative(self):
+        with self._lock: return {name: tuple(t) for name, t in self.totals.items()}
+
+    # 구간별 {count, sum, p50, p95, max} (초)
+    def summary(self):
+        by = {}
+        for _, name, sec in self.snapshot(): by.setdefault(name, []).append(sec)
+        out = {}
+        for name, xs in sorted(by.items()):
+            a = np.asarray(xs)
+            p50, p95 = np.percentile(a, [50, 95])
+            out[name] = {'count': len(a), 'sum': float(a.sum()), 'p50': float(p50), 'p95': float(p95), 'max': float(a.max())}
+        return out
+
+    # tmp 파일 → rename (수집기가 반쯤 쓴 파일을 읽지 않도록)
+    def _write(self, path, text):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w') as f: f.write(text)
+        os.replace(tmp, path)
+
+    def export_jsonl(self, path):
+        lines = [json.dumps({'ts': ts, 'span': name, 'sec': sec}, ensure_ascii=False) for ts, name, sec in self.snapshot()]
+        self._write(path, "\n".join(lines) + ("\n" if lines else ""))
+
+    # Prometheus text format (node_exporter textfile collector 등에서 그대로 수집)
+    # 분위수는 최근 구간(링 버퍼), _sum/_count는 누적값 (카운터는 줄어들면 안 되므로 rate()가 깨지지 않게)
+    def export_prometheus(self, path, metric="hh_span_seconds"):
+        lines = [f"# HELP {metric} Hojji & Hamzzi stage latency", f"# TYPE {metric} summary"]
+        window = self.summary()
+        for name, (count, total) in sorted(self.cumulative().items()):
+            s = window.get(name)
+            if s:
+                lines += [
+                    f'{metric}{{span="{name}",quantile="0.5"}} {s["p50"]:.6f}',
+                    f'{metric}{{span="{name}",quantile="0.95"}} {s["p95"]:.6f}',
+                ]
+            lines += [f'{metric}_sum{{span="{name}"}} {total:.6f}', f'{metric}_count{{span="{name}"}} {count}']
+        self._write(path, "\n".join(lines) + "\n")
+
+# 프로세스 공용 기록기
+TIMINGS = SpanRecorder(enabled=os.environ.get("HH_TIMING", "") not in ("", "0"))
+span = TIMINGS.span
+timed = TIMINGS.timed